@@ -0,0 +1,100 @@
+# Agent names and the classes in players.py implementing them. The classes are only imported
+# once an agent is created, so parsing a command line stays cheap.
+agents = {'human': 'Human', 'simpleAI': 'SimpleAI', 'randomAI': 'RandomAI', 'monteCarloAI': 'MonteCarloAI', 'mctsAI': 'MCTSAI', 'minimaxAI': 'MinimaxAI', 'alphaBetaAI': 'AlphaBetaAI', 'tdAI': 'TDAI', 'threatAI': 'ThreatSpaceAI'}
+
+
+def agent_class(name):
+    """
+    Description:
+        - Imports the class implementing an agent
+
+    Parameters:
+        - name (str) : The agent's name, a key of agents
+
+    Returns:
+        - A subclass of players.Player
+    """
+    import players
+    return getattr(players, agents[name])
+
+
+def add_agent_arguments(parser):
+    """
+    Description:
+        - Adds the command line options of the AI agents to a parser
+
+    Parameters:
+        - parser (argparse.ArgumentParser) : The parser to extend
+
+    Returns:
+        - None
+    """
+    parser.add_argument('-tt-size', default=1000000, type=int, help='Maximum number of positions kept in the transposition table shared by minimaxAI and alphaBetaAI.')
+    parser.add_argument('-depth', default=None, type=int, help='Search depth of minimaxAI and alphaBetaAI. By default 3x3 boards are searched to the end and larger boards 2 moves ahead.')
+    parser.add_argument('-time', default=None, type=float, help='Seconds per move for alphaBetaAI, which deepens its search until the time runs out (up to -depth if given).')
+    parser.add_argument('-eval', default=None, type=str, help='Evaluation model trained by evaluation.py for minimaxAI and alphaBetaAI to score positions at their search horizon.')
+    parser.add_argument('-book', default=None, type=str, help='Perfect-play table or search cache written by solver.py for minimaxAI and alphaBetaAI to play from.')
+    parser.add_argument('-threat-nodes', default=20000, type=int, help='Moves threatAI may try looking for a forced win through fours and threes before it falls back to alphaBetaAI\'s search.')
+    parser.add_argument('-td', default=None, type=str, help='Value table trained by td.py for tdAI, which plays the move to the best valued position. Untrained without it.')
+    parser.add_argument('-mc-simulations', default=1000, type=int, help='Random games per move for monteCarloAI.')
+    parser.add_argument('-workers', default=1, type=int, help='Worker processes used by monteCarloAI.')
+    parser.add_argument('-mcts-iterations', default=None, type=int, help='Iterations per move for mctsAI. Defaults to 10000 on boards of up to 25 cells and to no limit on larger ones. Use 0 for no limit.')
+    parser.add_argument('-mcts-time', default=None, type=float, help='Seconds per move for mctsAI. Defaults to 1 when there is no iteration limit.')
+    parser.add_argument('-mcts-memory', default=64, type=int, help='Megabytes of search tree kept by mctsAI.')
+    parser.add_argument('-ponder', action='store_true', help="Let monteCarloAI, mctsAI and alphaBetaAI keep searching in a background thread during the opponent's turn.")
+
+
+def check_agent(name, args, rows, cols, k):
+    """
+    Description:
+        - Checks that an agent can play a board shape with the given options, so problems are
+          reported before a game starts
+
+    Parameters:
+        - name (str) : The agent, a key of agents
+        - args (argparse.Namespace) : The parsed command line
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - None. Raises ValueError with the reason if the agent cannot play
+    """
+    if name == 'tdAI':
+        from indexing import MAX_INDEX_CELLS
+        if rows * cols > MAX_INDEX_CELLS: raise ValueError(f"tdAI only plays boards of up to {MAX_INDEX_CELLS} cells")
+        if args.td is not None:
+            from td import load_values
+            shape = load_values(args.td)[1]
+            if shape != (rows, cols, k): raise ValueError(f"{args.td} was trained for {shape[0]}x{shape[1]} k={shape[2]}, not {rows}x{cols} k={k}")
+
+
+def make_agent(name, symbol, args, book=None):
+    """
+    Description:
+        - Creates an agent configured from the options added by add_agent_arguments
+
+    Parameters:
+        - name (str) : The agent's name, a key of agents
+        - symbol (str) : 'X' or 'O'
+        - args (argparse.Namespace) : The parsed command line
+        - book (solver.OpeningBook) : Perfect-play table (or solver.SearchCache) for minimaxAI and alphaBetaAI, if any
+
+    Returns:
+        - A Player
+    """
+    from players import MonteCarloAI, MCTSAI, MinimaxAI, AlphaBetaAI, TDAI, ThreatSpaceAI
+    evaluator = None
+    if args.eval is not None and name in ('alphaBetaAI', 'minimaxAI', 'threatAI'):
+        from evaluation import load_evaluator
+        evaluator = load_evaluator(args.eval)
+    if name == 'alphaBetaAI': return AlphaBetaAI(symbol, book=book, max_depth=args.depth, time_limit=args.time, ponder=args.ponder, evaluator=evaluator)
+    if name == 'threatAI': return ThreatSpaceAI(symbol, max_nodes=args.threat_nodes, book=book, max_depth=args.depth, time_limit=args.time, ponder=args.ponder, evaluator=evaluator)
+    if name == 'minimaxAI': return MinimaxAI(symbol, book=book, max_depth=args.depth, evaluator=evaluator)
+    if name == 'tdAI':
+        from td import load_values
+        values, shape = (None, None) if args.td is None else load_values(args.td)
+        return TDAI(symbol, values, shape=shape)
+    if name == 'monteCarloAI': return MonteCarloAI(symbol, num_simulations=args.mc_simulations, workers=args.workers, ponder=args.ponder)
+    if name == 'mctsAI': return MCTSAI(symbol, iterations=args.mcts_iterations, time_limit=args.mcts_time, max_memory=args.mcts_memory * 2**20, ponder=args.ponder)
+    return agent_class(name)(symbol)
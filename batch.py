@@ -0,0 +1,226 @@
+import argparse
+import random
+import numpy as np
+from bitboard import Bitboard
+from rollouts import line_cells
+
+# Cell contents of the batched boards, also used as the winner codes
+EMPTY, X, O = 0, 1, 2
+
+# Per-shape (cells, lines through a cell) tables of line indexes, padded with -1
+_cell_lines = {}
+
+def cell_lines(rows, cols, k):
+    """
+    Description:
+        - Returns the indexes of the winning lines through each cell, so the wins of a batch
+          of moves can be checked with one gather
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A (cells, most lines through a cell) integer array, padded with -1
+    """
+    key = (rows, cols, k)
+    if key not in _cell_lines:
+        lines = line_cells(rows, cols, k)
+        through = [np.flatnonzero((lines == cell).any(axis=1)) for cell in range(rows * cols)]
+        table = np.full((rows * cols, max(1, max(len(ids) for ids in through))), -1, dtype=np.intp)
+        for cell, ids in enumerate(through): table[cell, :len(ids)] = ids
+        _cell_lines[key] = table
+    return _cell_lines[key]
+
+
+class BatchGame:
+    def __init__(self, n, board_shape=(3,3), k=None):
+        """
+        Description:
+            - Plays n games of the same shape in lockstep for self-play and agent evaluation.
+              All boards live in one contiguous (n, cells) int8 array of EMPTY, X and O, and
+              every step plays one move in each unfinished game with vectorized win checks.
+
+        Parameters:
+            - n (int) : Number of games
+            - board_shape : The shape of the boards. 3x3 by default
+            - k (int) : Number in a row needed to win. Defaults to min(3, rows, columns)
+        """
+        self.rows, self.cols = board_shape
+        self.k = min(3, self.rows, self.cols) if k is None else k
+        self.n = n
+        self.cells = self.rows * self.cols
+        self.lines = line_cells(self.rows, self.cols, self.k)
+        self.through = cell_lines(self.rows, self.cols, self.k)
+        self.boards = np.zeros((n, self.cells), dtype=np.int8)
+        self.grid = self.boards.reshape(n, self.rows, self.cols)
+        self.history = np.zeros((n, self.cells), dtype=np.int16)
+        self.plies = np.zeros(n, dtype=np.int16)
+        self.to_move = np.full(n, X, dtype=np.int8)
+        self.done = np.zeros(n, dtype=bool)
+        self.winners = np.zeros(n, dtype=np.int8)
+
+    def reset(self, games=None):
+        """
+        Description:
+            - Clears the boards of some or all of the games
+
+        Parameters:
+            - games : Indexes or boolean mask of the games to reset, all games if None
+
+        Returns:
+            - The boards
+        """
+        games = slice(None) if games is None else games
+        self.boards[games] = EMPTY
+        self.plies[games] = 0
+        self.to_move[games] = X
+        self.done[games] = False
+        self.winners[games] = EMPTY
+        return self.boards
+
+    def legal_moves(self):
+        """
+        Description:
+            - Returns which cells can be played in each game
+
+        Parameters:
+            - None
+
+        Returns:
+            - A (n, cells) boolean array, all False for finished games
+        """
+        return (self.boards == EMPTY) & ~self.done[:, None]
+
+    def step(self, moves):
+        """
+        Description:
+            - Plays one move in every unfinished game
+
+        Parameters:
+            - moves : (n,) cells to play. Entries of finished games are ignored.
+
+        Returns:
+            - (done, winners) arrays. winners holds X or O for won games and EMPTY otherwise,
+              so a finished game with no winner is a tie.
+        """
+        games = np.flatnonzero(~self.done)
+        cells = np.asarray(moves)[games].astype(np.intp)
+        if ((cells < 0) | (cells >= self.cells)).any() or (self.boards[games, cells] != EMPTY).any():
+            raise ValueError('illegal move in a batched game')
+        players = self.to_move[games]
+        self.boards[games, cells] = players
+        self.history[games, self.plies[games]] = cells
+        self.plies[games] += 1
+
+        # Only the lines through the cell just played can have been completed
+        through = self.through[cells]
+        owners = self.boards[games[:, None, None], self.lines[through]]
+        won = ((owners == players[:, None, None]).all(axis=2) & (through >= 0)).any(axis=1)
+        self.winners[games[won]] = players[won]
+        self.done[games[won | (self.plies[games] == self.cells)]] = True
+        self.to_move[games] = X + O - players
+        return self.done, self.winners
+
+    def results(self):
+        """
+        Description:
+            - Returns the result of every game in the form used by rules.check_winner
+
+        Parameters:
+            - None
+
+        Returns:
+            - A list of 'X', 'O', 'Tie' or None per game
+        """
+        return [None if not done else 'Tie' if winner == EMPTY else 'XO'[winner - 1] for done, winner in zip(self.done, self.winners)]
+
+    def state(self, game):
+        """
+        Description:
+            - Converts one game to a Bitboard, for agents that play a single position at a time
+
+        Parameters:
+            - game (int) : The game's index
+
+        Returns:
+            - A new Bitboard
+        """
+        board = self.boards[game]
+        x = int.from_bytes(np.packbits(board == X, bitorder='little').tobytes(), 'little')
+        o = int.from_bytes(np.packbits(board == O, bitorder='little').tobytes(), 'little')
+        return Bitboard(self.rows, self.cols, self.k, x, o, 0 if self.to_move[game] == X else 1)
+
+    def play(self, player1, player2, record=None, x_name=None, o_name=None):
+        """
+        Description:
+            - Plays every unfinished game to its end. At each step the games with X to move
+              ask player1 and those with O to move ask player2 for all their moves in one call.
+
+        Parameters:
+            - player1 : The policy playing X, anything with play_batch(env, games)
+            - player2 : The policy playing O
+            - record (records.RecordWriter) : File to append the finished games to, if any
+            - x_name (str) : Name of player1 in the record. Defaults to its class name
+            - o_name (str) : Name of player2 in the record. Defaults to its class name
+
+        Returns:
+            - (done, winners) arrays, see step
+        """
+        unfinished = np.flatnonzero(~self.done)
+        moves = np.full(self.n, -1, dtype=np.intp)
+        while not self.done.all():
+            for symbol, player in ((X, player1), (O, player2)):
+                games = np.flatnonzero(~self.done & (self.to_move == symbol))
+                if len(games): moves[games] = player.play_batch(self, games)
+            self.step(moves)
+        if record is not None:
+            x_name = type(player1).__name__ if x_name is None else x_name
+            o_name = type(player2).__name__ if o_name is None else o_name
+            for game, result in zip(unfinished, np.array(self.results(), dtype=object)[unfinished]):
+                record.write(self.rows, self.cols, self.k, x_name, o_name, None, result, self.history[game, :self.plies[game]].tolist())
+        return self.done, self.winners
+
+
+if __name__ == '__main__':
+    import time
+    import transposition
+    from agents import agents, add_agent_arguments, check_agent, make_agent
+    parser = argparse.ArgumentParser(description='Play many games between two agents in lockstep')
+    parser.add_argument('-w', default=3, type=int, help='Rows of game')
+    parser.add_argument('-l', default=3, type=int, help='Columns of game')
+    parser.add_argument('-k', default=None, type=int, help='Number in a row needed to win. Defaults to 3 (or the shorter side of smaller boards).')
+    parser.add_argument('-p1', default='randomAI', type=str, help='Agent playing X')
+    parser.add_argument('-p2', default='randomAI', type=str, help='Agent playing O')
+    parser.add_argument('-games', default=10000, type=int, help='Number of games to play')
+    parser.add_argument('-batch', default=4096, type=int, help='Games played in lockstep at a time')
+    parser.add_argument('-seed', default=0, type=int, help='Seed for Randomization. Enter an Integer Value.')
+    parser.add_argument('-record', default=None, type=str, help='File to append the games to in the compact record format of records.py')
+    add_agent_arguments(parser)
+    args = parser.parse_args()
+    for name in (args.p1, args.p2):
+        if name not in agents or name == 'human': parser.error(f"unknown AI agent {name}")
+        try: check_agent(name, args, args.w, args.l, min(3, args.w, args.l) if args.k is None else args.k)
+        except ValueError as error: parser.error(str(error))
+    args.ponder = False
+    random.seed(args.seed)
+    transposition.shared_table.max_entries = args.tt_size
+
+    record = None
+    if args.record is not None:
+        from records import RecordWriter, check_shape
+        try: check_shape(args.w, args.l)
+        except ValueError as error: parser.error(str(error))
+        record = RecordWriter(args.record)
+    player1, player2 = make_agent(args.p1, 'X', args), make_agent(args.p2, 'O', args)
+    results = {'X': 0, 'O': 0, 'Tie': 0}
+    start = time.perf_counter()
+    for first in range(0, args.games, args.batch):
+        env = BatchGame(min(args.batch, args.games - first), board_shape=(args.w, args.l), k=args.k)
+        env.play(player1, player2, record, agents[args.p1], agents[args.p2])
+        for result in env.results(): results[result] += 1
+    seconds = time.perf_counter() - start
+    print(f"X wins: {results['X']}, O wins: {results['O']}, Ties: {results['Tie']}")
+    print(f"{args.games} games in {seconds:.2f}s ({args.games / seconds:,.0f} games/s)")
+    if record is not None: record.close()
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from bitboard import Bitboard
+from board import TicTacToe
+from players import Player, MonteCarloAI, MCTSAI, MinimaxAI, AlphaBetaAI
+from rollouts import random_playouts
+from rules import check_winner
+from transposition import TranspositionTable
+
+# Whether a larger or a smaller value of each kind of metric is an improvement
+HIGHER, LOWER = 'higher', 'lower'
+
+
+def best_of(repeat, function):
+    """
+    Description:
+        - Runs a measurement several times and keeps the fastest run, which is the least disturbed by other load
+
+    Parameters:
+        - repeat (int) : Number of runs
+        - function : Callable returning (work done, seconds taken)
+
+    Returns:
+        - The (work, seconds) of the run with the highest rate
+    """
+    return max((function() for _ in range(repeat)), key=lambda run: run[0] / run[1])
+
+
+def first_move(agent, shape, k, trace=False):
+    """
+    Description:
+        - Lets an agent choose the first move of a game on an empty board
+
+    Parameters:
+        - agent (Player) : The agent playing X
+        - shape (tuple) : The board shape
+        - k (int) : Number in a row needed to win
+        - trace (bool) : Whether to trace allocations. Tracing slows Python down, so timed runs leave it off.
+
+    Returns:
+        - The peak bytes allocated during the move if trace is set, otherwise the seconds taken
+    """
+    game = TicTacToe(agent, Player('O'), board_shape=shape, k=k)
+    if trace: tracemalloc.start()
+    start = time.perf_counter()
+    agent.play(game)
+    seconds = time.perf_counter() - start
+    if not trace: return seconds
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench_check_winner(repeat):
+    state = Bitboard()
+    for cell in (4, 0, 8, 2, 6): state.make(cell)
+    cells = list(range(9))
+    def run():
+        start = time.perf_counter()
+        for _ in range(20000):
+            for cell in cells: check_winner(state, cell)
+        return 20000 * len(cells), time.perf_counter() - start
+    calls, seconds = best_of(repeat, run)
+    return calls / seconds
+
+
+def bench_rollouts(repeat):
+    state = Bitboard()
+    rng = np.random.default_rng(0)
+    def run():
+        start = time.perf_counter()
+        for cell in range(9): random_playouts(state, cell, 10000, rng)
+        return 90000, time.perf_counter() - start
+    games, seconds = best_of(repeat, run)
+    return games / seconds
+
+
+def bench_cold_start(command, repeat):
+    """
+    Description:
+        - Measures how long a command of this repository takes in a fresh interpreter, from
+          starting Python to its exit, which is dominated by imports for short commands
+
+    Parameters:
+        - command (list) : The script and its arguments
+        - repeat (int) : Number of runs
+
+    Returns:
+        - The seconds of the fastest run
+    """
+    def run():
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *command], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        return 1, time.perf_counter() - start
+    return best_of(repeat, run)[1]
+
+
+def bench_search(name, make, work, unit, repeat, shape=(3,3), k=3):
+    """
+    Description:
+        - Measures an agent's first move from the empty board. A fresh agent (and so an empty
+          transposition table or tree) is made for every run, after one untimed move has
+          filled the engine's per-shape caches.
+
+    Parameters:
+        - name (str) : Prefix of the metric names
+        - make : Callable returning a fresh agent playing X
+        - work : Callable returning the nodes or rollouts the agent went through in its last move
+        - unit (str) : What work counts, e.g. 'nodes'
+        - repeat (int) : Number of runs
+        - shape (tuple) : The board shape
+        - k (int) : Number in a row needed to win
+
+    Returns:
+        - A dict of metrics
+    """
+    first_move(make(), shape, k)
+    runs = []
+    for _ in range(repeat):
+        agent = make()
+        seconds = first_move(agent, shape, k)
+        runs.append((work(agent), seconds))
+    count, seconds = max(runs, key=lambda run: run[0] / run[1])
+    peak = min(first_move(make(), shape, k, trace=True) for _ in range(repeat))
+    return {f'{name}.{unit}_per_second': (count / seconds, f'{unit}/s', HIGHER),
+            f'{name}.first_move_seconds': (min(run[1] for run in runs), 's', LOWER),
+            f'{name}.peak_memory_per_move': (peak, 'bytes', LOWER)}
+
+
+def run_benchmarks(repeat):
+    """
+    Description:
+        - Runs every benchmark
+
+    Parameters:
+        - repeat (int) : Number of runs of each measurement
+
+    Returns:
+        - A dict mapping metric names to {'value', 'unit', 'better'}
+    """
+    random.seed(0)
+    metrics = {'rules.check_winner_calls_per_second': (bench_check_winner(repeat), 'calls/s', HIGHER),
+               'rollouts.random_playouts_per_second': (bench_rollouts(repeat), 'games/s', HIGHER),
+               'cli.best_move_cold_start_seconds': (bench_cold_start(['main.py', '-p1', 'alphaBetaAI', '-position', 'X..', '.O.', '...'], repeat), 's', LOWER),
+               'cli.headless_game_cold_start_seconds': (bench_cold_start(['main.py', '-p1', 'simpleAI', '-p2', 'randomAI', '-headless'], repeat), 's', LOWER)}
+    metrics.update(bench_search('minimaxAI', lambda: MinimaxAI('X', table=TranspositionTable()), lambda agent: agent.nodes, 'nodes', repeat))
+    metrics.update(bench_search('alphaBetaAI', lambda: AlphaBetaAI('X', table=TranspositionTable()), lambda agent: agent.stats['nodes'], 'nodes', repeat))
+    metrics.update(bench_search('alphaBetaAI.9x9k5', lambda: AlphaBetaAI('X', table=TranspositionTable(), max_depth=3), lambda agent: agent.stats['nodes'], 'nodes', repeat, shape=(9,9), k=5))
+    metrics.update(bench_search('mctsAI', lambda: MCTSAI('X', iterations=2000), lambda agent: agent.tree.iterations, 'iterations', repeat))
+    metrics.update(bench_search('monteCarloAI', lambda: MonteCarloAI('X'), lambda agent: agent.rollouts, 'rollouts', repeat))
+    return {name: {'value': value, 'unit': unit, 'better': better} for name, (value, unit, better) in metrics.items()}
+
+
+def compare(metrics, baseline, threshold):
+    """
+    Description:
+        - Finds the metrics that got worse than the baseline by more than threshold
+
+    Parameters:
+        - metrics (dict) : The current results
+        - baseline (dict) : The stored results
+        - threshold (float) : Allowed relative slowdown, e.g. 0.1 for 10%
+
+    Returns:
+        - A list of (name, baseline value, current value, relative change) tuples
+    """
+    regressions = []
+    for name, metric in metrics.items():
+        if name not in baseline: continue
+        before, after = baseline[name]['value'], metric['value']
+        change = (after - before) / before if before else 0.0
+        worse = -change if metric['better'] == HIGHER else change
+        if worse > threshold: regressions.append((name, before, after, change))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Tic Tac Toe engine and agents')
+    parser.add_argument('-repeat', default=5, type=int, help='Runs of each measurement. The best run is reported.')
+    parser.add_argument('-o', default=None, type=str, help='File to write the results to as JSON. Printed to stdout if omitted.')
+    parser.add_argument('-baseline', default=None, type=str, help='Results of an earlier run to compare against')
+    parser.add_argument('-threshold', default=0.1, type=float, help='Relative slowdown against the baseline that counts as a regression')
+    args = parser.parse_args()
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'metrics': run_benchmarks(args.repeat)}
+    if args.o is None: print(json.dumps(report, indent=2))
+    else:
+        with open(args.o, 'w') as f: json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f: baseline = json.load(f)['metrics']
+        regressions = compare(report['metrics'], baseline, args.threshold)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {before:,.4g} -> {after:,.4g} ({change:+.1%})", file=sys.stderr)
+        if regressions: sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}", file=sys.stderr)
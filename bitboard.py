@@ -0,0 +1,327 @@
+from rules import check_winner
+
+SYMBOLS = ('X', 'O')
+
+# Symmetry permutations and their byte lookup tables, computed once per board shape
+_symmetries = {}
+
+def symmetries(rows, cols):
+    """
+    Description:
+        - Returns the cell permutations of the board's symmetries. Square boards have 8
+          (rotations and reflections), rectangular boards have 4.
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+
+    Returns:
+        - A tuple of (perm, inverse, byte_tables) triples, where perm[cell] is the image of
+          cell, inverse undoes perm and byte_tables[i][b] is the image of byte b taken
+          from bits 8*i to 8*i+7 of a mask
+    """
+    key = (rows, cols)
+    if key not in _symmetries:
+        transforms = [lambda r, c: (r, c), lambda r, c: (rows - 1 - r, c),
+                      lambda r, c: (r, cols - 1 - c), lambda r, c: (rows - 1 - r, cols - 1 - c)]
+        if rows == cols:
+            transforms += [lambda r, c: (c, r), lambda r, c: (c, rows - 1 - r),
+                           lambda r, c: (cols - 1 - c, r), lambda r, c: (cols - 1 - c, rows - 1 - r)]
+        cells = rows * cols
+        result = []
+        for transform in transforms:
+            perm = []
+            for cell in range(cells):
+                row, col = transform(*divmod(cell, cols))
+                perm.append(row * cols + col)
+            byte_tables = []
+            for offset in range(0, cells, 8):
+
+                # The image of a byte is that of the byte without its lowest bit plus the lowest bit's
+                bits = [1 << perm[offset + bit] if offset + bit < cells else 0 for bit in range(8)]
+                table = [0] * 256
+                for byte in range(1, 256):
+                    low = byte & -byte
+                    table[byte] = table[byte ^ low] | bits[low.bit_length() - 1]
+                byte_tables.append(tuple(table))
+            inverse = [0] * cells
+            for cell, image in enumerate(perm): inverse[image] = cell
+            result.append((tuple(perm), tuple(inverse), tuple(byte_tables)))
+        _symmetries[key] = tuple(result)
+    return _symmetries[key]
+
+
+def transform_mask(mask, byte_tables):
+    """
+    Description:
+        - Applies a symmetry to a bit mask one byte at a time
+
+    Parameters:
+        - mask (int) : The bit mask to transform
+        - byte_tables : The byte lookup tables of the symmetry, see symmetries()
+
+    Returns:
+        - The transformed bit mask
+    """
+    image = 0
+    for table in byte_tables:
+        image |= table[mask & 0xFF]
+        mask >>= 8
+    return image
+
+
+class Bitboard:
+    """
+    Description:
+        - Compact game state. Each player's stones are an integer bit mask with bit
+          (row * cols + col) set for an occupied cell, and turn is 0 when X is to move
+          and 1 when O is to move.
+    """
+    __slots__ = ('rows', 'cols', 'k', 'x', 'o', 'turn', 'full', 'empty_count')
+
+    def __init__(self, rows=3, cols=3, k=3, x=0, o=0, turn=0):
+        """
+        Description:
+            - Initialization Function for a Bitboard
+
+        Parameters:
+            - rows (int) : Number of rows on the board
+            - cols (int) : Number of columns on the board
+            - k (int) : Number of cells in a row needed to win
+            - x (int) : Bit mask of the cells held by X
+            - o (int) : Bit mask of the cells held by O
+            - turn (int) : 0 if X is to move, 1 if O is to move
+        """
+        self.rows = rows
+        self.cols = cols
+        self.k = k
+        self.x = x
+        self.o = o
+        self.turn = turn
+        self.full = (1 << (rows * cols)) - 1
+        self.empty_count = rows * cols - bin(x | o).count('1')
+
+    @property
+    def symbol(self):
+        """The symbol of the player to move"""
+        return SYMBOLS[self.turn]
+
+    def mask(self, symbol):
+        """
+        Description:
+            - Returns the bit mask of the cells held by a player
+
+        Parameters:
+            - symbol (str) : 'X' or 'O'
+
+        Returns:
+            - The integer bit mask
+        """
+        return self.x if symbol == 'X' else self.o
+
+    def empty(self):
+        """
+        Description:
+            - Returns the bit mask of the empty cells
+
+        Parameters:
+            - None
+
+        Returns:
+            - The integer bit mask
+        """
+        return self.full & ~(self.x | self.o)
+
+    def is_empty(self, cell):
+        """Checks if a cell index is unoccupied"""
+        return not (self.x | self.o) >> cell & 1
+
+    def legal_moves(self):
+        """
+        Description:
+            - Lists the empty cells in row-major order by peeling off the lowest set bit
+
+        Parameters:
+            - None
+
+        Returns:
+            - A list of cell indexes
+        """
+        moves = []
+        empty = self.full & ~(self.x | self.o)
+        while empty:
+            low = empty & -empty
+            moves.append(low.bit_length() - 1)
+            empty ^= low
+        return moves
+
+    def make(self, cell):
+        """
+        Description:
+            - Places a stone for the player to move and passes the turn
+
+        Parameters:
+            - cell (int) : The cell index to play
+
+        Returns:
+            - None
+        """
+        if self.turn: self.o |= 1 << cell
+        else: self.x |= 1 << cell
+        self.turn ^= 1
+        self.empty_count -= 1
+
+    def unmake(self, cell):
+        """
+        Description:
+            - Takes back the last move, which must have been played on cell
+
+        Parameters:
+            - cell (int) : The cell index of the last move
+
+        Returns:
+            - None
+        """
+        self.turn ^= 1
+        if self.turn: self.o &= ~(1 << cell)
+        else: self.x &= ~(1 << cell)
+        self.empty_count += 1
+
+    def is_full(self):
+        """
+        Description:
+            - Checks if there are no empty cells left
+
+        Parameters:
+            - None
+
+        Returns:
+            - True if the board is full, False otherwise
+        """
+        return self.empty_count == 0
+
+    def winner(self, last=None):
+        """
+        Description:
+            - Determines the result of the position, see rules.check_winner
+
+        Parameters:
+            - last (int) : The cell of the last move, or None to check every line
+
+        Returns:
+            - 'X' or 'O' if that player has won, 'Tie' if the board is full, None otherwise
+        """
+        return check_winner(self, last)
+
+    def canonical(self):
+        """
+        Description:
+            - Finds the smallest image of the position under the board symmetries, so all
+              symmetric positions share one key
+
+        Parameters:
+            - None
+
+        Returns:
+            - (x, o, perm, inverse) of the canonical image, where perm maps cells of this
+              position to cells of the canonical one and inverse maps them back
+        """
+        best = None
+        for perm, inverse, byte_tables in symmetries(self.rows, self.cols):
+            image = (transform_mask(self.x, byte_tables), transform_mask(self.o, byte_tables))
+            if best is None or image < best[:2]: best = image + (perm, inverse)
+        return best
+
+    def cell(self, row, col):
+        """Returns the cell index of (row, col)"""
+        return row * self.cols + col
+
+    def rowcol(self, cell):
+        """Returns the (row, col) of a cell index"""
+        return divmod(cell, self.cols)
+
+    def copy(self):
+        """
+        Description:
+            - Returns an independent copy of the state
+
+        Parameters:
+            - None
+
+        Returns:
+            - A new Bitboard
+        """
+        return Bitboard(self.rows, self.cols, self.k, self.x, self.o, self.turn)
+
+    def to_array(self):
+        """
+        Description:
+            - Converts the state to the numpy string board used for rendering and printing
+
+        Parameters:
+            - None
+
+        Returns:
+            - A (rows, cols) numpy array of 'X', 'O' and ''
+        """
+        import numpy as np
+        board = np.full((self.rows, self.cols), '', dtype=str)
+        flat = board.reshape(-1)
+        for cell in range(self.rows * self.cols):
+            if self.x >> cell & 1: flat[cell] = 'X'
+            elif self.o >> cell & 1: flat[cell] = 'O'
+        return board
+
+    @classmethod
+    def from_array(cls, board, k=3, turn=None):
+        """
+        Description:
+            - Builds a state from a numpy string board
+
+        Parameters:
+            - board (np.ndarray) : A (rows, cols) array of 'X', 'O' and ''
+            - k (int) : Number of cells in a row needed to win
+            - turn (int) : Side to move. Inferred from the stone counts if None
+
+        Returns:
+            - A new Bitboard
+        """
+        rows, cols = board.shape
+        x = o = 0
+        for cell, value in enumerate(board.reshape(-1)):
+            if value == 'X': x |= 1 << cell
+            elif value == 'O': o |= 1 << cell
+        if turn is None: turn = 1 if bin(x).count('1') > bin(o).count('1') else 0
+        return cls(rows, cols, k, x, o, turn)
+
+    @classmethod
+    def parse(cls, rows, k=None, turn=None):
+        """
+        Description:
+            - Builds a state from rows of text, as given on the command line or in a server request
+
+        Parameters:
+            - rows (list) : One string per row, with 'X', 'O' and '.' (or ' ') for empty cells
+            - k (int) : Number in a row needed to win. Defaults to min(3, rows, columns)
+            - turn (str) : 'X' or 'O' to move. Inferred from the stone counts if None
+
+        Returns:
+            - A new Bitboard
+        """
+        if not rows or not isinstance(rows, list) or any(not isinstance(row, str) or len(row) != len(rows[0]) for row in rows):
+            raise ValueError('board must be a non-empty list of equally long strings')
+        n_rows, n_cols = len(rows), len(rows[0])
+        k = min(3, n_rows, n_cols) if k is None else k
+        if not 1 <= k <= max(n_rows, n_cols): raise ValueError(f"cannot get {k} in a row on a {n_rows}x{n_cols} board")
+        x = o = 0
+        for cell, value in enumerate(''.join(rows)):
+            if value == 'X': x |= 1 << cell
+            elif value == 'O': o |= 1 << cell
+            elif value not in '. ': raise ValueError(f"unknown cell {value!r}")
+        if turn is None: turn = 1 if bin(x).count('1') > bin(o).count('1') else 0
+        elif turn in SYMBOLS: turn = SYMBOLS.index(turn)
+        else: raise ValueError("turn must be 'X' or 'O'")
+        return cls(n_rows, n_cols, k, x, o, turn)
+
+    def __repr__(self):
+        return f"Bitboard(rows={self.rows}, cols={self.cols}, k={self.k}, x={self.x:#x}, o={self.o:#x}, turn={self.turn})"
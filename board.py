@@ -1,76 +1,41 @@
-import numpy as np
-import pygame
-import sys
 import random
-from copy import deepcopy
-import players
+from bitboard import Bitboard
+from rules import check_winner
 
 class TicTacToe:
-    def __init__(self, player1, player2, board_shape=(3,3)):
+    def __init__(self, player1, player2, board_shape=(3,3), k=None, renderer=None, verbose=False, instrumentation=None, record=None, seed=None):
         """
         Description:
-            - Initialization Function for Game of TicTacToe
+            - Initialization Function for Game of TicTacToe. The game runs headless unless a
+              renderer is attached, so AI-vs-AI games can be played without a display.
         
         Parameters:
             - player1 : The player agent object for Player 1
             - player2 : The player agent object for Player 2
             - board_shape : The shape of the board. 3x3 by default
-        """
-        self.board = np.full(board_shape, '', dtype=str)
+            - k (int) : Number in a row needed to win. Defaults to min(3, rows, columns)
+            - renderer : Optional observer (e.g. renderer.PygameRenderer) notified of every move
+            - verbose (bool) : Print the board to the console after every move
+            - instrumentation : Optional instrumentation.Instrumentation that measures every move
+            - record : Optional records.RecordWriter the finished game is appended to
+            - seed (int) : Seed the game is played with, stored in its record
+        """
+        rows, cols = board_shape
+        self.state = Bitboard(rows, cols, k=min(3, rows, cols) if k is None else k)
+        self._board = None
+        self.last_move = None
+        self.moves = []
         self.player1 = player1
         self.player2 = player2
         self.player1.opponent = self.player2
         self.player2.opponent = self.player1
         self.current_player = self.player1
         self.game_over = False
-        self.size = 300  # Size of the Pygame window
-        self.cell_size = self.size // 3
-        self.bg_color = (255, 255, 255)  # White
-        self.line_color = (0, 0, 0)  # Black
-        self.x_color = (255, 0, 0) # Red
-        self.o_color = (0, 0, 255) # Blue
-        pygame.init()
-        self.screen = pygame.display.set_mode((self.size, self.size))
-        pygame.display.set_caption("Tic Tac Toe")
-        self.screen.fill(self.bg_color)
-        self.draw_board()
-
-    def draw_board(self):
-        """
-        Description:
-            - Creates the TicTacToe Game Board
-        
-        Parameters:
-            - None
-            
-        Returns:
-            - None
-        """
-        for x in range(1, 3):
-            pygame.draw.line(self.screen, self.line_color, (0, x * self.cell_size), (self.size, x * self.cell_size), 2)
-            pygame.draw.line(self.screen, self.line_color, (x * self.cell_size, 0), (x * self.cell_size, self.size), 2)
-        pygame.display.update()
-
-    def draw_move(self, row, col):
-        """
-        Description:
-            - Draws a Move on the Pygame Board
-        
-        Parameters:
-            - row (int) : The row to make the move on
-            - col (int) : The column to make the move on
-            
-        Returns:
-            - None
-        """
-        centerX = col * self.cell_size + self.cell_size // 2
-        centerY = row * self.cell_size + self.cell_size // 2
-        if self.current_player.symbol == 'X':
-            pygame.draw.line(self.screen, self.x_color, (centerX - 40, centerY - 40), (centerX + 40, centerY + 40), 5)
-            pygame.draw.line(self.screen, self.x_color, (centerX + 40, centerY - 40), (centerX - 40, centerY + 40), 5)
-        else:
-            pygame.draw.circle(self.screen, self.o_color, (centerX, centerY), 40, 5)
-        pygame.display.update()
+        self.renderer = renderer
+        self.verbose = verbose
+        self.instrumentation = instrumentation
+        self.record = record
+        self.seed = seed
 
     def check_winner(self):
         """
@@ -85,25 +50,15 @@ class TicTacToe:
             - self.current_player if the current player has won the game
             - None otherwise
         """
-        # Check the rows and columns
-        for i in range(3):
-            if np.all(self.board[i,:] == self.current_player.symbol): self.game_over = True; return self.current_player
-            if np.all(self.board[:,i] == self.current_player.symbol): self.game_over = True; return self.current_player
-
-        # Check diagonals
-        if np.all(np.diag(self.board) == self.current_player.symbol) or np.all(np.diag(np.fliplr(self.board)) == self.current_player.symbol):
-            self.game_over = True; return self.current_player
-
-        # Check for a tie (if there are no empty cells left)
-        if np.all(self.board != ''): self.game_over = True; return 'Tie'
-
-        # If no winner and no tie, the game continues
-        return None
+        result = check_winner(self.state, self.last_move)
+        if result is None: return None
+        self.game_over = True
+        return 'Tie' if result == 'Tie' else self.current_player
 
     def make_move(self, row, col):
         """
         Description:
-            - Draws a Move on the TicTacToe Game Board
+            - Places a Move on the TicTacToe Game Board and notifies the renderer
         
         Parameters:
             - row (int) : The row to make the move on
@@ -112,8 +67,11 @@ class TicTacToe:
         Returns:
             - None
         """
-        self.board[row, col] = self.current_player.symbol
-        self.draw_move(row, col)
+        self.last_move = self.state.cell(row, col)
+        self.moves.append(self.last_move)
+        if self._board is not None: self._board[row, col] = self.state.symbol
+        self.state.make(self.last_move)
+        if self.renderer is not None: self.renderer.on_move(self, row, col)
         
     def make_random_move(self):
         """
@@ -121,14 +79,12 @@ class TicTacToe:
             - Makes a Random Move on the TicTacToe Game Board
         
         Parameters:
-            - row (int) : The row to make the move on
-            - col (int) : The column to make the move on
+            - None
             
         Returns:
-            - None
+            - (row, col) of the move that was made
         """
-        empty_cells = [(row, col) for row in range(3) for col in range(3) if self.board[row, col] == '']
-        row, col = random.choice(empty_cells)
+        row, col = self.state.rowcol(random.choice(self.state.legal_moves()))
         self.make_move(row, col)
         return row, col
             
@@ -151,29 +107,32 @@ class TicTacToe:
             - Main Game Loop. Gets Move from the player agents and plays it until the game has concluded.
         
         Parameters:
-            - Nonoe
+            - None
             
         Returns:
-            - None
+            - 'Tie' if the game ended in a tie, otherwise the winning player
         """
-
+        winner = None
         while not self.game_over:
         
             # Check if the Game was Quit
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    print("User Terminated the Game")
-                    sys.exit()
+            if self.renderer is not None: self.renderer.poll()
             
             # Get a Move from the Player Agent
-            print("------------------")
-            print(f"     {self.current_player.symbol}'s Turn     ")
-            print("------------------")
-            row, col = self.current_player.play(self)
+            if self.verbose:
+                print("------------------")
+                print(f"     {self.current_player.symbol}'s Turn     ")
+                print("------------------")
+            player = self.current_player
+            if self.instrumentation is not None: move = lambda: self.instrumentation.measure(self, player)
+            else: move = lambda: player.play(self)
+
+            # With a window, AI agents think in the background while the window keeps handling events
+            if self.renderer is not None and not player.interactive: row, col = self.renderer.run(move, f"Tic Tac Toe - {player.symbol} is thinking...")
+            else: row, col = move()
 
             # Play the Move from the Player if it is Valid, otherwise play random move
-            if 0 <= row < 3 and 0 <= col < 3 and self.board[row, col] == '':  # Assume valid move is returned
+            if 0 <= row < self.state.rows and 0 <= col < self.state.cols and self.state.is_empty(self.state.cell(row, col)):
                 self.make_move(row, col)
                 self.current_player.history.append((row, col))
             else:
@@ -181,40 +140,74 @@ class TicTacToe:
                 self.current_player.history.append((row, col))
             
             # Print the Current State of the Board
-            print(self.board)
+            if self.verbose: print(self.board)
             
             # Check if there is a Winner
             winner = self.check_winner()
             if winner == None:
                 self.switch_player()
-            elif winner == 'Tie':
-                self.game_over = True
-                print("The game is a tie!")
-                pygame.display.set_caption("Tic Tac Toe - Tie!")
             else:
                 self.game_over = True
-                print(f"{winner.symbol} wins!")
-                pygame.display.set_caption(f"Tic Tac Toe - {winner.symbol} Wins!")
+                if self.verbose: print("The game is a tie!" if winner == 'Tie' else f"{winner.symbol} wins!")
+                if self.renderer is not None: self.renderer.on_game_over(self, winner)
+                if self.instrumentation is not None: self.instrumentation.on_game_over(self, winner)
+                if self.record is not None: self.record.on_game_over(self, winner)
+                self.player1.stop()
+                self.player2.stop()
         
-        # If the Game Loop has Broken, Quit the Game
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                    break
+        return winner
         
+    def build_board(self):
+        # The numpy board is only built once something asks for it, so games played by
+        # agents that search the bitboard state never import numpy
+        self._board = self.state.to_array()
+        self.board_view = self._board.view()
+        self.board_view.flags.writeable = False
+
+    @property
+    def board(self):
+        if self._board is None: self.build_board()
+        return self._board
+
     def getBoard(self):
         """
         Description:
-            - Returns a copy of the board for foreign classes to use
+            - Returns the board as a read-only numpy string array for foreign classes to use.
+              The array is a view that follows the game as moves are made, so reading it
+              does not allocate; copy it to keep a snapshot.
         
         Parameters:
-            - Nonoe
+            - None
             
         Returns:
+            - A read-only view of the board
+        """
+        if self._board is None: self.build_board()
+        return self.board_view
+
+    def getView(self):
+        """
+        Description:
+            - Returns the game's own bitboard state for agents that only read it. It must not
+              be modified; agents that make moves on it must search on getState() instead.
+        
+        Parameters:
             - None
+            
+        Returns:
+            - The live state
         """
-        return deepcopy(self.board)
-                    
+        return self.state
 
+    def getState(self):
+        """
+        Description:
+            - Returns a private copy of the bitboard state for agents to search on
+        
+        Parameters:
+            - None
+            
+        Returns:
+            - A copy of the state
+        """
+        return self.state.copy()
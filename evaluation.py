@@ -0,0 +1,271 @@
+import argparse
+import numpy as np
+from rules import win_masks
+
+# Linear evaluation over line-occupancy features. For a player and a position, feature i
+# (1 <= i < k) counts the lines holding i of the player's stones and none of the opponent's,
+# feature k - 1 + i counts the same for the opponent, and the last two are whether the player
+# is to move and a constant. The model predicts the probability that the player goes on to
+# win (a draw counting as half), so it depends on k but not on the board shape.
+
+_line_matrices = {}
+_evaluators = {}
+
+def line_matrix(rows, cols, k):
+    """
+    Description:
+        - Returns the cells of every winning line as a 0/1 matrix, so line counts of many
+          positions are a single matrix product
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A (lines, cells) int16 numpy array
+    """
+    key = (rows, cols, k)
+    if key not in _line_matrices:
+        masks = win_masks(rows, cols, k)
+        matrix = np.zeros((len(masks), rows * cols), dtype=np.int16)
+        for line, mask in enumerate(masks):
+            for cell in range(rows * cols):
+                if mask >> cell & 1: matrix[line, cell] = 1
+        _line_matrices[key] = matrix
+    return _line_matrices[key]
+
+
+def bits(mask, cells):
+    """Returns the bits of a mask as an int16 array of length cells"""
+    return np.unpackbits(np.frombuffer(mask.to_bytes((cells + 7) // 8, 'little'), dtype=np.uint8), bitorder='little')[:cells].astype(np.int16)
+
+
+def line_features(mine, theirs, to_move, k):
+    """
+    Description:
+        - Builds the features of a batch of positions from their line counts
+
+    Parameters:
+        - mine (np.ndarray) : (positions, lines) stones of the player in each line
+        - theirs (np.ndarray) : (positions, lines) stones of the opponent in each line
+        - to_move (np.ndarray) : (positions,) 1 where the player is to move
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A (positions, 2 * k) float array
+    """
+    features = np.empty((len(mine), 2 * k))
+    mine_open, theirs_open = theirs == 0, mine == 0
+    for i in range(1, k):
+        features[:, i - 1] = ((mine == i) & mine_open).sum(axis=1)
+        features[:, k - 2 + i] = ((theirs == i) & theirs_open).sum(axis=1)
+    features[:, 2 * k - 2] = to_move
+    features[:, 2 * k - 1] = 1.0
+    return features
+
+
+def position_features(states, symbol):
+    """
+    Description:
+        - Builds the features of positions from the point of view of one player
+
+    Parameters:
+        - states (list) : Bitboard positions of the same shape
+        - symbol (str) : 'X' or 'O'
+
+    Returns:
+        - A (positions, 2 * k) float array
+    """
+    first = states[0]
+    cells, matrix = first.rows * first.cols, line_matrix(first.rows, first.cols, first.k)
+    mine = np.array([bits(state.mask(symbol), cells) for state in states]) @ matrix.T
+    theirs = np.array([bits(state.mask('O' if symbol == 'X' else 'X'), cells) for state in states]) @ matrix.T
+    to_move = np.array([state.symbol == symbol for state in states], dtype=float)
+    return line_features(mine, theirs, to_move, first.k)
+
+
+class LinearEvaluator:
+    def __init__(self, k, weights=None):
+        """
+        Description:
+            - Logistic model over line-occupancy features, used by minimaxAI and alphaBetaAI
+              in place of their positional evaluation
+
+        Parameters:
+            - k (int) : Number of cells in a row needed to win the model is made for
+            - weights (np.ndarray) : The 2 * k weights, zeros if None
+        """
+        self.k = k
+        self.weights = np.zeros(2 * k) if weights is None else np.asarray(weights, dtype=float)
+
+    def predict(self, features):
+        return 1.0 / (1.0 + np.exp(-np.clip(features @ self.weights, -30, 30)))
+
+    def evaluate(self, state, symbol):
+        """
+        Description:
+            - Evaluates a position
+
+        Parameters:
+            - state (Bitboard) : The position
+            - symbol (str) : The player whose chances are evaluated
+
+        Returns:
+            - The predicted score of the player, between 0 (loss) and 1 (win)
+        """
+        if state.k != self.k: raise ValueError(f"the model was trained for {self.k} in a row, not {state.k}")
+        return float(self.predict(position_features([state], symbol))[0])
+
+    def children(self, state, moves, symbol):
+        """
+        Description:
+            - Evaluates the positions reached by each of a list of moves in one batch. The
+              line counts of the position are computed once and each move adds its cell's
+              lines to the counts of the player making it.
+
+        Parameters:
+            - state (Bitboard) : The position the moves are played from
+            - moves (list) : The cells to play
+            - symbol (str) : The player whose chances are evaluated
+
+        Returns:
+            - A numpy array with the predicted score of the player after each move
+        """
+        if state.k != self.k: raise ValueError(f"the model was trained for {self.k} in a row, not {state.k}")
+        cells, matrix = state.rows * state.cols, line_matrix(state.rows, state.cols, state.k)
+        mine = matrix @ bits(state.mask(symbol), cells)
+        theirs = matrix @ bits(state.mask('O' if symbol == 'X' else 'X'), cells)
+        added = matrix[:, moves].T
+        moving = state.symbol == symbol
+        mine = mine + added if moving else np.broadcast_to(mine, added.shape)
+        theirs = np.broadcast_to(theirs, added.shape) if moving else theirs + added
+        to_move = np.full(len(moves), 0.0 if moving else 1.0)
+        return self.predict(line_features(mine, theirs, to_move, state.k))
+
+    def play_batch(self, env, games, batch_size=2**22):
+        """
+        Description:
+            - Greedy policy for batch.BatchGame: in every game, plays the move after which the
+              model rates the player to move highest, or a winning move if there is one
+
+        Parameters:
+            - env (batch.BatchGame) : The games
+            - games (np.ndarray) : Indexes of the unfinished games to move in
+            - batch_size (int) : Most (game, move, line) counts held in memory at once
+
+        Returns:
+            - A numpy array with the cell to play in each game
+        """
+        if env.k != self.k: raise ValueError(f"the model was trained for {self.k} in a row, not {env.k}")
+        matrix = line_matrix(env.rows, env.cols, env.k)
+        boards, players = env.boards[games], env.to_move[games][:, None]
+        mine = (boards == players).astype(np.int16) @ matrix.T
+        theirs = ((boards != players) & (boards != 0)).astype(np.int16) @ matrix.T
+        moves = np.empty(len(games), dtype=np.intp)
+        chunk = max(1, batch_size // (env.cells * len(matrix)))
+        for start in range(0, len(games), chunk):
+            end = min(start + chunk, len(games))
+            child_mine = mine[start:end, None, :] + matrix.T[None, :, :]
+            child_theirs = np.broadcast_to(theirs[start:end, None, :], child_mine.shape)
+            shape = child_mine.shape
+            scores = self.predict(line_features(child_mine.reshape(-1, shape[2]), child_theirs.reshape(-1, shape[2]), np.zeros(shape[0] * shape[1]), self.k)).reshape(shape[:2])
+            scores[((child_mine == self.k) & (child_theirs == 0)).any(axis=2)] = 2.0
+            scores[boards[start:end] != 0] = -1.0
+            moves[start:end] = scores.argmax(axis=1)
+        return moves
+
+    def fit(self, features, targets, l2=1e-3, iterations=50):
+        """
+        Description:
+            - Fits the weights by Newton's method on the regularized cross-entropy
+
+        Parameters:
+            - features (np.ndarray) : (samples, 2 * k) features
+            - targets (np.ndarray) : (samples,) scores between 0 and 1
+            - l2 (float) : Strength of the weight penalty
+            - iterations (int) : Maximum number of Newton steps
+
+        Returns:
+            - The mean cross-entropy of the fitted model
+        """
+        n = len(features)
+        penalty = l2 * n * np.eye(len(self.weights))
+        for _ in range(iterations):
+            p = self.predict(features)
+            gradient = features.T @ (p - targets) + penalty @ self.weights
+            hessian = (features * (p * (1 - p))[:, None]).T @ features + penalty
+            step = np.linalg.solve(hessian, gradient)
+            self.weights -= step
+            if np.abs(step).max() < 1e-8: break
+        p = np.clip(self.predict(features), 1e-12, 1 - 1e-12)
+        return float(-(targets * np.log(p) + (1 - targets) * np.log(1 - p)).mean())
+
+    def save(self, path):
+        np.savez(path, k=self.k, weights=self.weights)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data: return cls(int(data['k']), data['weights'])
+
+
+def load_evaluator(path):
+    """
+    Description:
+        - Loads a saved model once per process
+
+    Parameters:
+        - path (str) : The file written by LinearEvaluator.save
+
+    Returns:
+        - A LinearEvaluator
+    """
+    if path not in _evaluators: _evaluators[path] = LinearEvaluator.load(path)
+    return _evaluators[path]
+
+
+def training_data(records):
+    """
+    Description:
+        - Turns recorded games into training samples. Every position before the end of a game
+          gives one sample for each player, labelled with that player's final result.
+
+    Parameters:
+        - records : Iterable of records.GameRecord
+
+    Returns:
+        - (features, targets) numpy arrays
+    """
+    from records import replay
+    features, targets = [], []
+    for record in records:
+        if record.winner is None: continue
+        positions = replay(record)[:-1]
+        if not positions: continue
+        for symbol in ('X', 'O'):
+            features.append(position_features(positions, symbol))
+            targets.append(np.full(len(positions), 0.5 if record.winner == 'Tie' else float(record.winner == symbol)))
+    if not features: raise ValueError('no finished games to train on')
+    return np.concatenate(features), np.concatenate(targets)
+
+
+if __name__ == '__main__':
+    from records import GameRecords
+    parser = argparse.ArgumentParser(description='Train the evaluation model of minimaxAI and alphaBetaAI from recorded games')
+    parser.add_argument('records', nargs='+', type=str, help='Record files written with -record')
+    parser.add_argument('-k', default=None, type=int, help='Only train on games with this many in a row. Defaults to the k of the first game.')
+    parser.add_argument('-l2', default=1e-3, type=float, help='Strength of the weight penalty')
+    parser.add_argument('-o', default='eval.npz', type=str, help='File to write the model to')
+    args = parser.parse_args()
+
+    games = [record for path in args.records for record in GameRecords(path)]
+    if not games: parser.error('the record files hold no games')
+    k = games[0].k if args.k is None else args.k
+    features, targets = training_data(record for record in games if record.k == k)
+    model = LinearEvaluator(k)
+    loss = model.fit(features, targets, args.l2)
+    accuracy = ((model.predict(features) > 0.5) == (targets > 0.5))[targets != 0.5].mean()
+    print(f"Trained on {len(targets)} positions from {len(games)} games, cross-entropy {loss:.4f}, decided games predicted {accuracy:.1%} right")
+    print(f"Weights: {np.round(model.weights, 3).tolist()}")
+    model.save(args.o)
+    print(f"Wrote {args.o}")
@@ -0,0 +1,166 @@
+from math import comb
+import numpy as np
+from bitboard import symmetries
+
+# Positions are ranked combinatorially: boards are grouped by their number of pieces n (X
+# moves first, so X holds ceil(n / 2) of them), and within a group a board's rank combines
+# the rank of the set of occupied cells among all cells with the rank of the set of X cells
+# among the occupied ones. Every board whose piece counts can occur gets a distinct rank
+# below the number of such boards, and ranks are turned into symmetry classes by a table.
+MAX_INDEX_CELLS = 16  # Largest board whose class table is built (about 10 million ranks for 4x4)
+LOW_CELLS = 10  # Cells enumerated together while building a class table (3**10 boards at a time)
+
+_indexes = {}
+
+
+class PositionIndex:
+    def __init__(self, rows, cols):
+        """
+        Description:
+            - Perfect hash of the positions of a board shape. rank() numbers every position
+              densely and index() numbers them up to symmetry, so per-position data can be
+              kept in flat arrays. Use position_index() to share one per shape.
+
+        Parameters:
+            - rows (int) : Number of rows on the board
+            - cols (int) : Number of columns on the board
+        """
+        self.rows, self.cols = rows, cols
+        self.cells = cells = rows * cols
+        if cells > MAX_INDEX_CELLS: raise ValueError(f"positions can only be indexed on boards of up to {MAX_INDEX_CELLS} cells")
+        self.binomials = np.array([[comb(n, r) for r in range(cells + 2)] for n in range(cells + 1)], dtype=np.int64)
+        sizes = [comb(cells, n) * comb(n, (n + 1) // 2) for n in range(cells + 1)]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.size = int(self.offsets[-1])
+        self.classes = self.build_classes()
+        self.count = int(self.classes.max()) + 1
+
+    def rank(self, x, o):
+        """
+        Description:
+            - Numbers a position
+
+        Parameters:
+            - x (int) : Bit mask of the cells held by X
+            - o (int) : Bit mask of the cells held by O
+
+        Returns:
+            - An int below self.size
+        """
+        occupied_rank = x_rank = n = xs = 0
+        for cell in range(self.cells):
+            if (x | o) >> cell & 1:
+                n += 1
+                occupied_rank += comb(cell, n)
+                if x >> cell & 1:
+                    xs += 1
+                    x_rank += comb(n - 1, xs)
+        return int(self.offsets[n]) + occupied_rank * comb(n, (n + 1) // 2) + x_rank
+
+    def ranks(self, boards):
+        """
+        Description:
+            - Numbers a batch of positions, the vectorized rank()
+
+        Parameters:
+            - boards (np.ndarray) : (positions, cells) array of 0 (empty), 1 (X) and 2 (O)
+
+        Returns:
+            - An int64 array of ranks
+        """
+        occupied, xs = boards > 0, boards == 1
+        before = np.cumsum(occupied, axis=1, dtype=np.int32)  # Occupied cells up to and including each cell
+        n = before[:, -1]
+        width = self.binomials.shape[1]
+        table = self.binomials.ravel()
+        occupied_rank = (table[np.arange(self.cells, dtype=np.int32) * width + before] * occupied).sum(axis=1)
+        x_rank = (table[np.maximum(before - 1, 0) * width + np.cumsum(xs, axis=1, dtype=np.int32)] * xs).sum(axis=1)
+        return self.offsets[n] + occupied_rank * self.binomials[n, (n + 1) // 2] + x_rank
+
+    def unrank(self, rank):
+        """
+        Description:
+            - Inverse of rank()
+
+        Parameters:
+            - rank (int) : The rank of a position
+
+        Returns:
+            - (x, o) bit masks of the position
+        """
+        n = int(np.searchsorted(self.offsets, rank, side='right')) - 1
+        occupied_rank, x_rank = divmod(rank - int(self.offsets[n]), comb(n, (n + 1) // 2))
+        occupied = combination(occupied_rank, n, self.cells)
+        chosen = set(combination(x_rank, (n + 1) // 2, n))
+        x = o = 0
+        for i, cell in enumerate(occupied):
+            if i in chosen: x |= 1 << cell
+            else: o |= 1 << cell
+        return x, o
+
+    def index(self, x, o):
+        """
+        Description:
+            - Numbers a position up to symmetry: symmetric positions share an index
+
+        Parameters:
+            - x (int) : Bit mask of the cells held by X
+            - o (int) : Bit mask of the cells held by O
+
+        Returns:
+            - An int below self.count
+        """
+        return int(self.classes[self.rank(x, o)])
+
+    def build_classes(self):
+        # Enumerate every board with valid piece counts, pick the image with the smallest base-3
+        # number as the representative of its class, and number the classes in rank order of
+        # their representatives. Boards are enumerated as every low part (the first LOW_CELLS
+        # cells) under one high part at a time.
+        perms = np.array([perm for perm, _, _ in symmetries(self.rows, self.cols)], dtype=np.intp)
+        inverses = np.array([inverse for _, inverse, _ in symmetries(self.rows, self.cols)], dtype=np.intp)
+        image_powers = (3.0 ** np.arange(self.cells))[perms].T  # Exact in float64 up to 33 cells
+        low_cells = min(self.cells, LOW_CELLS)
+        low = digits(np.arange(3 ** low_cells), low_cells)
+        low_x, low_o = (low == 1).sum(axis=1), (low == 2).sum(axis=1)
+        representatives = np.empty(self.size, dtype=np.int64)
+        for high in digits(np.arange(3 ** (self.cells - low_cells)), self.cells - low_cells):
+            x_count, o_count = low_x + (high == 1).sum(), low_o + (high == 2).sum()
+            keep = (x_count == o_count) | (x_count == o_count + 1)
+            boards = np.concatenate([low[keep], np.broadcast_to(high, (int(keep.sum()), len(high)))], axis=1)
+            best = inverses[(boards @ image_powers).argmin(axis=1)]
+            representatives[self.ranks(boards)] = self.ranks(np.take_along_axis(boards, best, axis=1))
+        first = representatives == np.arange(self.size)
+        return (np.cumsum(first) - 1)[representatives].astype(np.int32)
+
+
+def digits(numbers, cells):
+    # Base-3 digits of numbers, least significant first, as a (len(numbers), cells) int8 array
+    return (numbers[:, None] // 3 ** np.arange(cells, dtype=np.int64) % 3).astype(np.int8)
+
+
+def combination(rank, size, n):
+    # The rank-th subset of size elements of range(n) in combinatorial number order, ascending
+    chosen = []
+    for j in range(size, 0, -1):
+        c = j - 1
+        while comb(c + 1, j) <= rank: c += 1
+        rank -= comb(c, j)
+        chosen.append(c)
+    return chosen[::-1]
+
+
+def position_index(rows, cols):
+    """
+    Description:
+        - Returns the PositionIndex of a board shape, building it on first use
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+
+    Returns:
+        - A PositionIndex
+    """
+    if (rows, cols) not in _indexes: _indexes[(rows, cols)] = PositionIndex(rows, cols)
+    return _indexes[(rows, cols)]
@@ -0,0 +1,168 @@
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+
+# Per-move metrics of a game, written as one JSON object per line. Agents report the work
+# they did on a move through Player.publish, e.g. nodes, depth, tt_hits or rollouts.
+
+
+def add_instrumentation_arguments(parser):
+    """
+    Description:
+        - Adds the instrumentation options to a parser
+
+    Parameters:
+        - parser (argparse.ArgumentParser) : The parser to extend
+
+    Returns:
+        - None
+    """
+    parser.add_argument('-metrics', default=None, type=str, help="File to log per-move metrics to as JSON lines. Use '-' for stderr.")
+    parser.add_argument('-profile', default=None, type=str, help='File to write a cProfile of the agents\' moves to (read it with python -m pstats).')
+    parser.add_argument('-trace-memory', action='store_true', help='Record the peak memory allocated during every move with tracemalloc. Slows the agents down.')
+
+
+def make_instrumentation(args):
+    """
+    Description:
+        - Creates the instrumentation asked for on the command line
+
+    Parameters:
+        - args (argparse.Namespace) : The parsed command line
+
+    Returns:
+        - An Instrumentation, or None if no option was given
+    """
+    if args.metrics is None and args.profile is None and not args.trace_memory: return None
+    if args.metrics == '-': log = sys.stderr
+    elif args.metrics is not None: log = open(args.metrics, 'w')
+    else: log = None
+    return Instrumentation(log, args.profile, args.trace_memory)
+
+
+def percentile(values, fraction):
+    """
+    Description:
+        - Nearest-rank percentile
+
+    Parameters:
+        - values (list) : Sorted values
+        - fraction (float) : The percentile as a fraction, e.g. 0.99
+
+    Returns:
+        - The value below which the fraction of values lie
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Instrumentation:
+    def __init__(self, log=None, profile=None, trace_memory=False):
+        """
+        Description:
+            - Measures every move the players of a game make. Attach it to a game with
+              TicTacToe(..., instrumentation=...).
+
+        Parameters:
+            - log : Open file to write the JSON records to, or None to only keep the summary
+            - profile (str) : File to write a cProfile of all moves to on close, or None
+            - trace_memory (bool) : Record the peak memory allocated during every move
+        """
+        self.log = log
+        self.profile = profile
+        self.profiler = cProfile.Profile() if profile is not None else None
+        self.trace_memory = trace_memory
+        self.started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing: tracemalloc.start()
+        self.games = 0
+        self.game_start = time.perf_counter()
+        self.wall_times = {}
+        self.last = None
+
+    def measure(self, game, player):
+        """
+        Description:
+            - Asks a player for its move and records how long it took and what work it published
+
+        Parameters:
+            - game (TicTacToe) : The game being played
+            - player (Player) : The player to move
+
+        Returns:
+            - The (row, col) the player chose
+        """
+        player.counters = {}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        if self.profiler is not None: self.profiler.enable()
+        start = time.perf_counter()
+        try: row, col = player.play(game)
+        finally:
+            wall_time = time.perf_counter() - start
+            if self.profiler is not None: self.profiler.disable()
+        record = {'event': 'move', 'game': self.games, 'ply': game.state.rows * game.state.cols - game.state.empty_count + 1,
+                  'player': player.symbol, 'agent': type(player).__name__, 'move': [int(row), int(col)], 'wall_time': wall_time}
+        record.update(player.counters)
+        if self.trace_memory: record['alloc_peak'] = tracemalloc.get_traced_memory()[1] - before
+        self.wall_times.setdefault(record['agent'], []).append(wall_time)
+        self.last = record
+        self.write(record)
+        return row, col
+
+    def on_game_over(self, game, winner):
+        """
+        Description:
+            - Records the end of a game
+
+        Parameters:
+            - game (TicTacToe) : The game that has concluded
+            - winner : 'Tie' or the winning player
+
+        Returns:
+            - None
+        """
+        now = time.perf_counter()
+        self.write({'event': 'game', 'game': self.games, 'winner': 'Tie' if winner == 'Tie' else winner.symbol,
+                    'plies': game.state.rows * game.state.cols - game.state.empty_count, 'wall_time': now - self.game_start})
+        self.games += 1
+        self.game_start = now
+
+    def summary(self):
+        """
+        Description:
+            - Summarizes the move times of every agent, to spot latency outliers
+
+        Parameters:
+            - None
+
+        Returns:
+            - A dict mapping agent names to their move count, mean, median, 99th percentile and maximum move time
+        """
+        result = {}
+        for agent, times in self.wall_times.items():
+            times = sorted(times)
+            result[agent] = {'moves': len(times), 'mean': sum(times) / len(times), 'p50': percentile(times, 0.5),
+                             'p99': percentile(times, 0.99), 'max': times[-1]}
+        return result
+
+    def write(self, record):
+        if self.log is None: return
+        self.log.write(json.dumps(record) + '\n')
+
+    def close(self):
+        """
+        Description:
+            - Logs the summary, writes the profile and stops tracing memory
+
+        Parameters:
+            - None
+
+        Returns:
+            - None
+        """
+        for agent, stats in self.summary().items(): self.write({'event': 'summary', 'agent': agent, **stats})
+        if self.profiler is not None: self.profiler.dump_stats(self.profile)
+        if self.started_tracing: tracemalloc.stop()
+        if self.log is not None and self.log is not sys.stderr: self.log.close()
@@ -1,25 +1,103 @@
 import argparse
 import random
+from bitboard import Bitboard
 from board import TicTacToe
-from players import Human, SimpleAI, RandomAI, MonteCarloAI, MinimaxAI, AlphaBetaAI
+import transposition
+from agents import agents, add_agent_arguments, check_agent, make_agent
+from instrumentation import add_instrumentation_arguments, make_instrumentation
 
 parser = argparse.ArgumentParser(description='Run Tic Tac Toe game')
 parser.add_argument('-w', default=3, type=int, help='Rows of game')
 parser.add_argument('-l', default=3, type=int, help='Columns of game')
-parser.add_argument('-p1', default='human', type=str, help='Player 1 agent. Use any of the following: [human, stupidAI, randomAI, monteCarloAI, minimaxAI, alphaBetaAI]')
-parser.add_argument('-p2', default='human', type=str, help='Player 2 agent. Use any of the following: [human, stupidAI, randomAI, monteCarloAI, minimaxAI, alphaBetaAI]')
+parser.add_argument('-k', default=None, type=int, help='Number in a row needed to win. Defaults to 3 (or the shorter side of smaller boards). Use -w 15 -l 15 -k 5 for gomoku.')
+parser.add_argument('-p1', default='human', type=str, help='Player 1 agent. Use any of the following: [human, simpleAI, randomAI, monteCarloAI, mctsAI, minimaxAI, alphaBetaAI, tdAI, threatAI]')
+parser.add_argument('-p2', default='human', type=str, help='Player 2 agent. Use any of the following: [human, simpleAI, randomAI, monteCarloAI, mctsAI, minimaxAI, alphaBetaAI, tdAI, threatAI]')
 parser.add_argument('-seed', default=0, type=int, help='Seed for Randomization. Enter an Integer Value.')
+parser.add_argument('-headless', action='store_true', help='Play without opening a Pygame window. Not available for human players.')
+parser.add_argument('-fps', default=30, type=int, help='Most window redraws per second. AI-vs-AI games in a window play at most this many moves per second.')
+parser.add_argument('-games', default=1, type=int, help='Number of games to play. Only used with -headless.')
+add_agent_arguments(parser)
+add_instrumentation_arguments(parser)
+parser.add_argument('-record', default=None, type=str, help='File to append the played games to in the compact record format of records.py')
+parser.add_argument('-position', default=None, nargs='+', type=str, help="Print the move of -p1 in a position given as one string per row, e.g. -position X.. .O. ..., and exit. Sets the board shape.")
+parser.add_argument('-turn', default=None, choices=['X', 'O'], help='Side to move in -position. Inferred from the stone counts by default.')
 
 args = parser.parse_args()
+for name in (args.p1, args.p2):
+    if name not in agents: parser.error(f"unknown agent {name}, use one of {', '.join(agents)}")
+
+position = None
+if args.position is not None:
+    try: position = Bitboard.parse(args.position, args.k, args.turn)
+    except ValueError as error: parser.error(str(error))
+    if args.p1 == 'human': parser.error('-position needs an AI agent, choose one with -p1')
+    if position.winner() is not None: parser.error('the game is already over in -position')
+    args.w, args.l, args.k = position.rows, position.cols, position.k
 
 w = args.w
 l = args.l
+k = args.k if args.k is not None else min(3, w, l)
+for name in (args.p1,) if position is not None else (args.p1, args.p2):
+    try: check_agent(name, args, w, l, k)
+    except ValueError as error: parser.error(str(error))
+if args.record is not None and position is None:
+    from records import check_shape
+    try: check_shape(w, l)
+    except ValueError as error: parser.error(str(error))
 random.seed(args.seed)
+transposition.shared_table.max_entries = args.tt_size
+
+book = None
+if args.book is not None:
+    from solver import open_book
+    try: book = open_book(args.book, w, l, k)
+    except (OSError, ValueError) as error: parser.error(f"cannot use -book {args.book}: {error}")
+
+if __name__ == '__main__' and position is not None:
+    from players import Player
+    player = make_agent(args.p1, position.symbol, args, book)
+    game = TicTacToe(player, Player('O' if position.symbol == 'X' else 'X'), board_shape=(w,l), k=k, seed=args.seed)
+    game.state = position
+    row, col = player.play(game)
+    player.stop()
+    print(row, col)
 
-agents = {'human': Human, 'simpleAI': SimpleAI, 'randomAI': RandomAI, 'monteCarloAI': MonteCarloAI, 'minimaxAI': MinimaxAI, 'alphaBetaAI': AlphaBetaAI}
+elif __name__ == '__main__':
+    instrumentation = make_instrumentation(args)
+    record = None
+    if args.record is not None:
+        from records import RecordWriter
+        record = RecordWriter(args.record)
+    if args.headless:
+        if 'human' in (args.p1, args.p2): parser.error('human players need a window, drop -headless')
+        from tournament import game_seed
+        results = {'X': 0, 'O': 0, 'Tie': 0}
+        last_players = ()  # The agents of the last game, none if no game was played
+        for game in range(args.games):
 
-if __name__ == '__main__':
-    player1 = agents[args.p1]('X')
-    player2 = agents[args.p2]('O')
-    tic_tac_toe = TicTacToe(player1, player2, board_shape=(w,l))
-    tic_tac_toe.play()
+            # Every game gets its own seed, so each recorded game can be replayed on its own
+            seed = game_seed(args.seed, game)
+            random.seed(seed)
+            player1 = make_agent(args.p1, 'X', args, book)
+            player2 = make_agent(args.p2, 'O', args, book)
+            winner = TicTacToe(player1, player2, board_shape=(w,l), k=k, instrumentation=instrumentation, record=record, seed=seed).play()
+            results['Tie' if winner == 'Tie' else winner.symbol] += 1
+            last_players = (player1, player2)
+        print(f"X wins: {results['X']}, O wins: {results['O']}, Ties: {results['Tie']}")
+        if len(transposition.shared_table): print(f"Transposition table: {transposition.shared_table.stats()}")
+        from players import MonteCarloAI, AlphaBetaAI
+        for player in last_players:
+            if isinstance(player, MonteCarloAI): print(f"{player.symbol} rollouts per second (last game): {player.rollouts_per_second:,.0f}")
+            if isinstance(player, AlphaBetaAI): print(f"{player.symbol} last search: {player.stats}")
+        if instrumentation is not None:
+            for agent, stats in instrumentation.summary().items(): print(f"{agent} move times: {stats}")
+            instrumentation.close()
+    else:
+        from renderer import PygameRenderer
+        player1 = make_agent(args.p1, 'X', args, book)
+        player2 = make_agent(args.p2, 'O', args, book)
+        renderer = PygameRenderer(board_shape=(w,l), fps=args.fps)
+        tic_tac_toe = TicTacToe(player1, player2, board_shape=(w,l), k=k, renderer=renderer, verbose=True, instrumentation=instrumentation, record=record, seed=args.seed)
+        tic_tac_toe.play()
+        if instrumentation is not None: instrumentation.close()
+        renderer.wait_for_close()
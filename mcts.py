@@ -0,0 +1,331 @@
+import math
+import random
+import time
+from array import array
+from rules import check_winner
+
+# Bytes used by one node across the pool's arrays
+NODE_BYTES = 4 + 2 + 4 + 2 + 4 + 8 + 1
+INITIAL_NODES = 4096  # Nodes a pool has room for before it first grows
+
+class NodePool:
+    def __init__(self, capacity):
+        """
+        Description:
+            - Store for search tree nodes. Each node field is a flat typed array indexed by
+              node number, and the children of a node occupy a contiguous block starting at
+              first_child, so the tree costs NODE_BYTES per node instead of a Python object
+              each. The arrays start small and double as the tree grows, up to capacity.
+
+        Parameters:
+            - capacity (int) : Maximum number of nodes
+        """
+        self.capacity = capacity
+        self.allocated = min(capacity, INITIAL_NODES)
+        self.parent = array('i', [-1]) * self.allocated
+        self.move = array('h', [-1]) * self.allocated
+        self.first_child = array('i', [-1]) * self.allocated
+        self.num_children = array('h', [0]) * self.allocated
+        self.visits = array('i', [0]) * self.allocated
+        self.value = array('d', [0.0]) * self.allocated  # Results summed from the view of the player who moved into the node
+        self.terminal = array('b', [0]) * self.allocated
+        self.size = 0
+
+    def grow(self, needed):
+        # Enlarge every field to hold at least needed nodes. New entries are set by new_node.
+        allocated = min(self.capacity, max(needed, 2 * self.allocated))
+        for field in (self.parent, self.move, self.first_child, self.num_children, self.visits, self.value, self.terminal):
+            field.frombytes(bytes(field.itemsize * (allocated - self.allocated)))
+        self.allocated = allocated
+
+    def clear(self):
+        """
+        Description:
+            - Frees every node
+
+        Parameters:
+            - None
+
+        Returns:
+            - None
+        """
+        self.size = 0
+
+    def new_node(self, parent, move):
+        """
+        Description:
+            - Allocates a single unexpanded node
+
+        Parameters:
+            - parent (int) : Index of the parent node, -1 for a root
+            - move (int) : The cell played to reach the node, -1 for a root
+
+        Returns:
+            - The index of the node, or None if the pool is full
+        """
+        if self.size >= self.capacity: return None
+        if self.size >= self.allocated: self.grow(self.size + 1)
+        node = self.size
+        self.size += 1
+        self.parent[node] = parent
+        self.move[node] = move
+        self.first_child[node] = -1
+        self.num_children[node] = 0
+        self.visits[node] = 0
+        self.value[node] = 0.0
+        self.terminal[node] = 0
+        return node
+
+    def expand(self, node, moves):
+        """
+        Description:
+            - Allocates a contiguous block of children for a node, one per move
+
+        Parameters:
+            - node (int) : The node to expand
+            - moves (list) : The cells playable from the node
+
+        Returns:
+            - True if the node was expanded, False if the pool had no room left
+        """
+        if self.size + len(moves) > self.capacity: return False
+        if self.size + len(moves) > self.allocated: self.grow(self.size + len(moves))
+        self.first_child[node] = self.size
+        self.num_children[node] = len(moves)
+        for move in moves: self.new_node(node, move)
+        return True
+
+
+class MCTS:
+    def __init__(self, max_nodes=500000, exploration=math.sqrt(2), rng=None):
+        """
+        Description:
+            - Monte Carlo Tree Search with the UCT selection rule. The tree is kept between
+              searches; advance() moves the root down to the child reached by a move so the
+              statistics gathered under it are reused on the next turn.
+
+        Parameters:
+            - max_nodes (int) : Capacity of the node pool
+            - exploration (float) : UCT exploration constant
+            - rng (random.Random) : Source of randomness for the playouts
+        """
+        self.pool = NodePool(max_nodes)
+        self.exploration = exploration
+        self.rng = rng if rng is not None else random.Random()
+        self.root = None
+        self.root_state = None
+        self.iterations = 0
+
+    def reset(self, state):
+        """
+        Description:
+            - Discards the tree and starts a new one at state
+
+        Parameters:
+            - state (Bitboard) : The new root position
+
+        Returns:
+            - None
+        """
+        self.pool.clear()
+        self.root = self.pool.new_node(-1, -1)
+        self.root_state = state.copy()
+
+    def advance(self, cell):
+        """
+        Description:
+            - Moves the root to the child reached by playing cell, keeping its subtree. The
+              rest of the tree stays allocated until the next reset.
+
+        Parameters:
+            - cell (int) : The cell that was played from the root position
+
+        Returns:
+            - None
+        """
+        if self.root is None: return
+        pool = self.pool
+        first = pool.first_child[self.root]
+        for child in range(first, first + pool.num_children[self.root]):
+            if pool.move[child] == cell:
+                self.root = child
+                self.root_state.make(cell)
+                return
+        self.root = None
+
+    def search(self, state, iterations=None, time_limit=None):
+        """
+        Description:
+            - Runs UCT iterations from state until an iteration or time budget runs out. The
+              tree is reused if its root is state, and restarted otherwise or when the pool
+              is full.
+
+        Parameters:
+            - state (Bitboard) : The position to search
+            - iterations (int) : Maximum number of iterations, or None for no limit
+            - time_limit (float) : Maximum number of seconds, or None for no limit
+
+        Returns:
+            - None
+        """
+        if iterations is None and time_limit is None: raise ValueError("MCTS needs an iteration or time budget")
+        if (self.root is None or self.pool.size >= self.pool.capacity
+                or (self.root_state.x, self.root_state.o, self.root_state.turn) != (state.x, state.o, state.turn)):
+            self.reset(state)
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        done = 0
+
+        # The clock is read before every iteration: one can take milliseconds on a large board
+        while iterations is None or done < iterations:
+            if deadline is not None and time.perf_counter() >= deadline: break
+            self.iterate()
+            done += 1
+        self.iterations = done
+
+    def ponder(self, stop):
+        """
+        Description:
+            - Keeps searching from the current root, typically during the opponent's turn,
+              until stop is set or the pool is full
+
+        Parameters:
+            - stop (threading.Event) : Set to end the search
+
+        Returns:
+            - Number of iterations run
+        """
+        done = 0
+        while self.root is not None and not stop.is_set() and self.pool.size + self.root_state.empty_count < self.pool.capacity:
+            self.iterate()
+            done += 1
+        return done
+
+    def root_visits(self, state):
+        """
+        Description:
+            - Returns how many iterations the tree already holds for a position
+
+        Parameters:
+            - state (Bitboard) : The position
+
+        Returns:
+            - The visits of the root if the tree is rooted at state, 0 otherwise
+        """
+        if self.root is None or (self.root_state.x, self.root_state.o, self.root_state.turn) != (state.x, state.o, state.turn): return 0
+        return self.pool.visits[self.root]
+
+    def child_visits(self):
+        """
+        Description:
+            - Returns the visits of every move from the root
+
+        Parameters:
+            - None
+
+        Returns:
+            - A dict of cell to visits, empty if the root has not been expanded
+        """
+        if self.root is None: return {}
+        pool = self.pool
+        first = pool.first_child[self.root]
+        return {pool.move[child]: pool.visits[child] for child in range(first, first + pool.num_children[self.root])}
+
+    def iterate(self):
+        """
+        Description:
+            - Runs one selection, expansion, playout and backpropagation pass
+
+        Parameters:
+            - None
+
+        Returns:
+            - None
+        """
+        pool = self.pool
+        state = self.root_state.copy()
+        node = self.root
+
+        # Selection: descend through expanded nodes by the UCT rule
+        while pool.num_children[node] and not pool.terminal[node]:
+            node = self.select(node)
+            state.make(pool.move[node])
+
+        # Expansion: nodes get children the second time they are reached
+        winner = None if node == self.root else check_winner(state, pool.move[node])
+        if winner is not None: pool.terminal[node] = 1
+        elif (pool.visits[node] or node == self.root) and pool.expand(node, state.legal_moves()):
+            node = pool.first_child[node] + self.rng.randrange(pool.num_children[node])
+            state.make(pool.move[node])
+            winner = check_winner(state, pool.move[node])
+
+        # Playout
+        mover = 'O' if state.turn == 0 else 'X'
+        if winner is None: winner = self.playout(state)
+
+        # Backpropagation, scoring each node for the player who moved into it
+        while node != -1:
+            pool.visits[node] += 1
+            if winner == mover: pool.value[node] += 1.0
+            elif winner == 'Tie': pool.value[node] += 0.5
+            mover = 'X' if mover == 'O' else 'O'
+            if node == self.root: break
+            node = pool.parent[node]
+
+    def select(self, node):
+        """
+        Description:
+            - Picks the child of node with the highest UCT score, unvisited children first
+
+        Parameters:
+            - node (int) : An expanded node
+
+        Returns:
+            - The index of the chosen child
+        """
+        pool = self.pool
+        first = pool.first_child[node]
+        log_visits = math.log(pool.visits[node] or 1)
+        best, best_score = first, -1.0
+        for child in range(first, first + pool.num_children[node]):
+            visits = pool.visits[child]
+            if visits == 0: return child
+            score = pool.value[child] / visits + self.exploration * math.sqrt(log_visits / visits)
+            if score > best_score: best, best_score = child, score
+        return best
+
+    def playout(self, state):
+        """
+        Description:
+            - Plays random moves until the game ends
+
+        Parameters:
+            - state (Bitboard) : The position to play from. It is modified
+
+        Returns:
+            - 'X', 'O' or 'Tie'
+        """
+        # Playing the empty cells in a random order is the same as picking a random empty cell
+        # at every move, without listing the legal moves each time
+        moves = state.legal_moves()
+        self.rng.shuffle(moves)
+        for cell in moves:
+            state.make(cell)
+            winner = check_winner(state, cell)
+            if winner is not None: return winner
+        return 'Tie'
+
+    def best_move(self):
+        """
+        Description:
+            - Returns the most visited move at the root
+
+        Parameters:
+            - None
+
+        Returns:
+            - A cell index
+        """
+        pool = self.pool
+        first = pool.first_child[self.root]
+        best = max(range(first, first + pool.num_children[self.root]), key=lambda child: pool.visits[child])
+        return pool.move[best]
@@ -0,0 +1,77 @@
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from rollouts import random_playouts
+
+# Worker pools are started once per worker count and reused for the rest of the process
+_pools = {}
+
+def _ping(_):
+    return os.getpid()
+
+
+def get_pool(workers):
+    """
+    Description:
+        - Returns a persistent process pool, starting every worker on first use so later
+          moves do not pay the process start-up and import cost
+
+    Parameters:
+        - workers (int) : Number of worker processes
+
+    Returns:
+        - A ProcessPoolExecutor
+    """
+    if workers not in _pools:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        list(pool.map(_ping, range(workers)))
+        _pools[workers] = pool
+    return _pools[workers]
+
+
+@atexit.register
+def shutdown():
+    """
+    Description:
+        - Stops every worker pool
+
+    Parameters:
+        - None
+
+    Returns:
+        - None
+    """
+    for pool in _pools.values(): pool.shutdown(cancel_futures=True)
+    _pools.clear()
+
+
+def _playout_task(state, moves, n, seed):
+    rng = np.random.default_rng(seed)
+    return [int(random_playouts(state, cell, n, rng).sum()) for cell in moves]
+
+
+def parallel_playouts(state, moves, n, rng, workers):
+    """
+    Description:
+        - Splits the random playouts of every move evenly across worker processes. Each share
+          draws from its own stream spawned from a single seed taken from rng, and the shares
+          are summed in a fixed order, so the scores only depend on rng and the worker count.
+
+    Parameters:
+        - state (Bitboard) : The position to play from
+        - moves (list) : The cells to score
+        - n (int) : Number of playouts per move
+        - rng (np.random.Generator) : Source of the seed for this call
+        - workers (int) : Number of worker processes
+
+    Returns:
+        - A numpy array with the summed playout results of each move
+    """
+    pool = get_pool(workers)
+    streams = np.random.SeedSequence(int(rng.integers(2**63))).spawn(workers)
+    shares = [n // workers + (i < n % workers) for i in range(workers)]
+    futures = [pool.submit(_playout_task, state, moves, share, stream) for share, stream in zip(shares, streams) if share]
+    scores = np.zeros(len(moves))
+    for future in futures: scores += future.result()
+    return scores
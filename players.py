@@ -1,361 +1,871 @@
 import random
-import numpy as np
-import pygame
-import sys
 import math
-from copy import deepcopy
+import time
+import threading
+from mcts import MCTS, NODE_BYTES
+from transposition import TranspositionTable, shared_table, EXACT, LOWER, UPPER
+from rules import lines_through, check_winner
+
+# Boards up to this many cells are searched to the end of the game by default
+EXHAUSTIVE_CELLS = 9
+DEFAULT_DEPTH = 2
+
+# mctsAI runs a fixed number of iterations per move on boards up to this many cells, and
+# searches for a fixed time on larger ones, where iterations get much slower
+ITERATION_CELLS = 25
+DEFAULT_ITERATIONS = 10000
+DEFAULT_MCTS_TIME = 1.0
+
+# numpy (used by monteCarloAI's playouts) and pygame (used by human players) are imported
+# where they are needed, so scripts that only use the search agents start quickly
+
+# Per-shape tables used by the heuristic agents
+_preferred_moves = {}
+_weight_masks = {}
+
+def preferred_moves(rows, cols, k):
+    """
+    Description:
+        - Orders the cells by the number of winning lines through them, breaking ties by the
+          distance to the centre and then row-major order. On 3x3 this is the centre, the
+          corners and then the edges.
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A tuple of cell indexes
+    """
+    key = (rows, cols, k)
+    if key not in _preferred_moves:
+        through = lines_through(rows, cols, k)
+        def priority(cell):
+            row, col = divmod(cell, cols)
+            return (-len(through[cell]), (2 * row - rows + 1) ** 2 + (2 * col - cols + 1) ** 2, cell)
+        _preferred_moves[key] = tuple(sorted(range(rows * cols), key=priority))
+    return _preferred_moves[key]
+
+
+def weight_masks(rows, cols, k):
+    """
+    Description:
+        - Groups the cells by their weight in the positional evaluation. 3x3 keeps the
+          original weights (centre 10, corners 5, edges 1); other boards weigh each cell by
+          the number of winning lines through it.
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A tuple of (weight, mask) pairs
+    """
+    key = (rows, cols, k)
+    if key not in _weight_masks:
+        through = lines_through(rows, cols, k)
+        if key == (3, 3, 3): weights = [{4: 10, 3: 5, 2: 1}[len(lines)] for lines in through]
+        else: weights = [len(lines) for lines in through]
+        groups = {}
+        for cell, weight in enumerate(weights):
+            if weight: groups[weight] = groups.get(weight, 0) | 1 << cell
+        _weight_masks[key] = tuple(groups.items())
+    return _weight_masks[key]
+
+
+def win_score(state):
+    """
+    Description:
+        - Value of a won position, 50 or more so it outweighs any positional evaluation
+
+    Parameters:
+        - state (Bitboard) : Any position on the board
+
+    Returns:
+        - The score of a win
+    """
+    total = sum(weight * bin(mask).count('1') for weight, mask in weight_masks(state.rows, state.cols, state.k))
+    return max(50, total + 1)
+
+
+class SearchTimeout(Exception):
+    pass
+
 
 class Player:
+    interactive = False  # Whether the agent plays through the game window
+
     def __init__(self, symbol):
         self.symbol = symbol
         self.opponent = None
         self.history = []
+        self.counters = {}
+        self.ponder_thread = None
+        self.ponder_stop = threading.Event()
 
     def play(self, env):
         pass
 
+    def play_batch(self, env, games):
+        from board import TicTacToe
+
+        # Play each game of a batch.BatchGame on its own, for agents without a batched policy
+        cells = []
+        for game in games:
+            state = env.state(game)
+            single = TicTacToe(self, Player('O' if self.symbol == 'X' else 'X'), board_shape=(state.rows, state.cols), k=state.k)
+            single.state = state
+            row, col = self.play(single)
+            self.stop()
+            cells.append(state.cell(row, col))
+        return cells
+
+    def startPondering(self, work):
+        
+        # Run work(stop_event) in a background thread during the opponent's turn
+        self.stop()
+        self.ponder_stop.clear()
+        self.ponder_thread = threading.Thread(target=work, args=(self.ponder_stop,), daemon=True)
+        self.ponder_thread.start()
+
+    def stop(self):
+        
+        # End any background search. Called before every move and once the game is over
+        if self.ponder_thread is None: return
+        self.ponder_stop.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
+
+    def publish(self, **counters):
+        
+        # Report the work done on the current move, e.g. nodes=..., to the game's instrumentation
+        self.counters.update(counters)
+
 class Human(Player):
+    interactive = True
+
     def play(self, env):
     
-        # Wait until the user has played a valid move
-        while True:
-            for event in pygame.event.get():
-            
-                # If the User quits the game, quit the game
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    print("User Termianted the Game")
-                    sys.exit()
-                    
-                # If the User has clicked on a position on the board, check it
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    mouseX, mouseY = event.pos
-                    row = mouseY // env.cell_size
-                    col = mouseX // env.cell_size
-                    
-                    # If the move is valid, return it
-                    if env.getBoard()[row, col] == '':
-                        return row, col
+        # Sleep until the user has clicked on an empty cell of the window, so a pondering opponent gets the CPU
+        state = env.getView()
+        return env.renderer.wait_for_click(lambda row, col: state.is_empty(state.cell(row, col)))
 
 class SimpleAI(Player):
     def play(self, env):
         
-        # Get the Current Game Board
-        board = env.getBoard()
+        # Get the Current Game State
+        state = env.getView()
         
         # List of moves to play
-        moves = [(1,1), (0,0), (0,2), (2,0), (2,2), (0,1), (1,0), (1,2), (2,1)]
+        moves = preferred_moves(state.rows, state.cols, state.k)
         
         # Find a Valid Move and Return it
-        for row, col in moves:
-            if board[row, col] == '': return row, col
+        for cell in moves:
+            if state.is_empty(cell): return state.rowcol(cell)
+
+    def play_batch(self, env, games):
+        import numpy as np
+
+        # The first empty cell in the order of preference, found for every game at once
+        rank = np.empty(env.cells, dtype=np.int32)
+        rank[list(preferred_moves(env.rows, env.cols, env.k))] = np.arange(env.cells)
+        return np.where(env.boards[games] == 0, rank, env.cells).argmin(axis=1)
 
 
 class RandomAI(Player):
     def play(self, env):
         
-        # Get the Current Game Board
-        board = env.getBoard()
+        # Get the Current Game State
+        state = env.getView()
         
         # Get the List of Possible Moves
-        possible = [(row, col) for row in range(3) for col in range(3) if board[row, col] == '']
+        possible = state.legal_moves()
             
         # Select a Random Move and Play it
-        row, col = random.choice(possible)
+        row, col = state.rowcol(random.choice(possible))
         return row, col
 
+    def play_batch(self, env, games):
+        import numpy as np
+
+        # Give every empty cell a random priority and play the highest in each game
+        rng = np.random.default_rng(random.getrandbits(64))
+        return np.where(env.boards[games] == 0, rng.random((len(games), env.cells)), -1.0).argmax(axis=1)
+
 
 class MonteCarloAI(Player):
 
+    def __init__(self, symbol, num_simulations=1000, seed=None, workers=1, ponder=False):
+        import numpy as np
+        super().__init__(symbol)
+        self.num_simulations = num_simulations
+        self.workers = workers
+        self.ponder = ponder
+        self.rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+        self.rollouts = 0
+        self.rollout_time = 0.0
+        self.pondered = {}
+
     def play(self, env):
+        import numpy as np
+        from parallel import parallel_playouts
+        from rollouts import random_playouts
     
-        # Deepcopy environment to avoid mutating original game state
-        board = env.getBoard()
+        # The playouts only read the state, so no copy is needed
+        state = env.getView()
         
         # Find legal moves
-        possible_moves = [(row, col) for row in range(3) for col in range(3) if board[row, col] == '']
-        
-        # Init fitness trackers
-        scores = np.zeros(len(possible_moves))
-
-        # Simulate games
-        num_simulations = 1000
-        for i in range(num_simulations):
-            for move_index, (row, col) in enumerate(possible_moves):
-            
-                # Simulate a random game starting with this move
-                board = env.getBoard()
-                score = self.playRandomGame(board, (row, col))
-                scores[move_index] += score
+        possible_moves = state.legal_moves()
+        
+        # Init fitness trackers, starting from the games played while pondering on this position
+        self.stop()
+        scores, done = self.pondered.get((state.x, state.o), (np.zeros(len(possible_moves)), 0))
+        self.pondered = {}
+        remaining = max(0, self.num_simulations - done)
+
+        # Simulate games, a whole batch of random games per move, split across processes if asked
+        start = time.perf_counter()
+        if remaining and self.workers > 1: scores = scores + parallel_playouts(state, possible_moves, remaining, self.rng, self.workers)
+        elif remaining:
+            for move_index, cell in enumerate(possible_moves):
+                scores[move_index] += random_playouts(state, cell, remaining, self.rng).sum()
+        self.rollout_time += time.perf_counter() - start
+        self.rollouts += remaining * len(possible_moves)
+        self.publish(rollouts=remaining * len(possible_moves), pondered=done * len(possible_moves))
 
         # Choose the move with the highest score
         best_move_index = np.argmax(scores)
-        return possible_moves[best_move_index]
-
+        cell = possible_moves[best_move_index]
+        if self.ponder: self.ponderReplies(state, cell)
+        return state.rowcol(cell)
+
+    def ponderReplies(self, state, cell, batch=64):
+        import numpy as np
+        from rollouts import random_playouts
+        
+        # While the opponent thinks, play games from every position its reply can lead to,
+        # a batch per position at a time so all of them get some
+        state = state.copy()
+        state.make(cell)
+        if check_winner(state, cell) is not None: return
+        rng = np.random.default_rng(self.rng.integers(2**63))
+        def work(stop):
+            replies = [reply for reply in state.legal_moves()]
+            while replies:
+                for reply in list(replies):
+                    if stop.is_set(): return
+                    child = state.copy()
+                    child.make(reply)
+                    moves = child.legal_moves()
+                    scores, done = self.pondered.get((child.x, child.o), (np.zeros(len(moves)), 0))
+                    if check_winner(child, reply) is not None or done >= self.num_simulations:
+                        replies.remove(reply)
+                        continue
+                    n = min(batch, self.num_simulations - done)
+                    scores = scores + [random_playouts(child, move, n, rng).sum() for move in moves]
+                    self.pondered[(child.x, child.o)] = (scores, done + n)
+        self.startPondering(work)
+
+    @property
+    def rollouts_per_second(self):
+        return self.rollouts / self.rollout_time if self.rollout_time else 0.0
+        
+
+class MCTSAI(Player):
+
+    def __init__(self, symbol, iterations=None, time_limit=None, max_memory=64 * 2**20, ponder=False):
+        super().__init__(symbol)
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.ponder = ponder
+        self.unpondered = {}  # Visits of each reply to our last move before pondering started
+        self.tree = MCTS(max_nodes=max_memory // NODE_BYTES, rng=random.Random(random.getrandbits(64)))
 
-    def playRandomGame(self, board, first_move):
-    
-        # Make the first move
-        switch = {'X': 'O', 'O': 'X'}
-        symbol = self.symbol
-        row, col = first_move
-        board[row, col] = symbol
-
-        # While the Game has not Ended
-        while True:
-        
-            # Switch players
-            symbol = switch[symbol]
-            
-            # Get current board state
-            possible = [(row, col) for row in range(3) for col in range(3) if board[row, col] == '']
-            if not possible: return 0
-
-            # Select a Random Move and Play It
-            row, col = random.choice(possible)
-            board[row, col] = symbol
-            
-            # If there is a Winner, End the Game and Return Results
-            winner = self.check_winner(board, symbol)
-            if winner == self.symbol: return 1
-            elif winner == switch[self.symbol]: return -1
-            elif winner == 'Tie': return 0
-            else: continue
-            
-        
-    def check_winner(self, board, symbol):
-        
-        # Check the rows and columns
-        for i in range(3):
-            if np.all(board[i,:] == symbol) or np.all(board[:,i] == symbol): return symbol
+    def play(self, env):
+        state = env.getView()
+        
+        # Follow the opponent's last move down the tree kept from our previous turn
+        self.stop()
+        reply = state.cell(*self.opponent.history[-1]) if self.opponent.history else None
+        if reply is not None: self.tree.advance(reply)
+        
+        # When pondering, the iterations spent on this position during the opponent's turn count
+        # towards the budget, but not those our previous search already spent on it
+        iterations, time_limit = self.budget(state)
+        pondered = 0
+        if self.ponder and reply is not None:
+            pondered = max(0, self.tree.root_visits(state) - self.unpondered.get(reply, 0))
+            if iterations is not None: iterations = max(1, iterations - pondered)
+        self.unpondered = {}
+        
+        # Search and keep the subtree of the chosen move for the next turn
+        self.tree.search(state, iterations, time_limit)
+        self.publish(rollouts=self.tree.iterations, pondered=pondered, tree_nodes=self.tree.pool.size)
+        cell = self.tree.best_move()
+        self.tree.advance(cell)
+        
+        # Keep growing that subtree while the opponent thinks
+        if self.ponder and check_winner(self.tree.root_state, cell) is None and not self.tree.root_state.is_full():
+            self.unpondered = self.tree.child_visits()
+            self.startPondering(self.tree.ponder)
+        return state.rowcol(cell)
+
+    def budget(self, state):
+        
+        # Iterations unless told otherwise (0 for no limit), and a time limit when there is no iteration limit
+        iterations = self.iterations
+        if iterations is None: iterations = DEFAULT_ITERATIONS if state.rows * state.cols <= ITERATION_CELLS else 0
+        time_limit = self.time_limit
+        if not iterations and time_limit is None: time_limit = DEFAULT_MCTS_TIME
+        return iterations or None, time_limit
 
-        # Check diagonals
-        if np.all(np.diag(board) == symbol) or np.all(np.diag(np.fliplr(board)) == symbol): return symbol
 
-        # Check for a tie (if there are no empty cells left)
-        if np.all(board != ''): return 'Tie'
+class MinimaxAI(Player):
 
-        # If no winner and no tie, the game continues
-        return None
+    def __init__(self, symbol, table=None, book=None, max_depth=None, evaluator=None):
+        super().__init__(symbol)
+        self.max_depth = max_depth
+        self.evaluator = evaluator
         
-
-class MinimaxAI(Player):
+        # Values of a learned evaluation must not mix with those of the positional one in the shared table
+        if table is None: table = shared_table if evaluator is None else TranspositionTable()
+        self.table = table
+        self.book = book
+        self.nodes = 0
 
     def play(self, env):
-        board = env.getBoard()
-        _, row, col = self.maxValue(board)
-        return row, col
+        state = env.getView()
+        
+        # Play straight from the solved table when one is loaded
+        if self.book is not None:
+            cell = self.book.best_move(state)
+            if cell is not None: self.publish(book_hits=1); return state.rowcol(cell)
+            
+        self.nodes, hits, depth = 0, self.table.hits, self.searchDepth(state)
+        _, cell = self.maxValue(state.copy(), depth)
+        self.publish(nodes=self.nodes, depth=depth, tt_hits=self.table.hits - hits)
+        return state.rowcol(cell)
         
     
-    def maxValue(self, board):
+    def maxValue(self, state, depth):
+        self.nodes += 1
+        
+        # At the search horizon, fall back to the positional evaluation
+        if depth == 0: return self.evaluate(state), None
         
         # Get the List of Possible Moves
-        possible = [(row, col) for row in range(3) for col in range(3) if board[row, col] == '']
+        possible = state.legal_moves()
+        
+        # Reuse a previous search of this position (or a symmetric one)
+        entry = self.table.probe(state)
+        if entry is not None and entry[1] == EXACT and entry[3] >= depth: return entry[0], entry[2]
+        
+        # One move from the horizon, score every move at once with the learned evaluation
+        if depth == 1 and self.evaluator is not None: return self.leafValues(state, possible, True)
         
         # Initialize the Maximum Value to Negative Infinity
         max_val = -math.inf
-        max_row, max_col = None, None
-        symbol = self.symbol
+        max_cell = None
         
         # Find the Best Move
-        for row, col in possible:
+        for cell in possible:
             
             # Simulate the Move
-            new_board = deepcopy(board)
-            new_board[row, col] = symbol
+            state.make(cell)
             
             # Check if player has won
-            winner = self.check_winner(new_board, symbol)
-            if winner == 'Win': return 50, row, col
-            if winner == 'Tie': return self.evaluate(new_board), row, col
+            winner = check_winner(state, cell)
+            if winner == 'Tie': value = self.evaluate(state); state.unmake(cell); return value, cell
+            if winner is not None: state.unmake(cell); return win_score(state), cell
             
             # Get the Maximum Value
-            value, _, _ = self.minValue(new_board)
-            if value > max_val: max_val, max_row, max_col = value, row, col
+            value, _ = self.minValue(state, depth - 1)
+            state.unmake(cell)
+            if value > max_val: max_val, max_cell = value, cell
             
-        return max_val, max_row, max_col
+        self.table.store(state, max_val, EXACT, max_cell, depth)
+        return max_val, max_cell
         
     
-    def minValue(self, board):
+    def minValue(self, state, depth):
+        self.nodes += 1
     
+        # At the search horizon, fall back to the positional evaluation
+        if depth == 0: return self.evaluate(state), None
+        
         # Get the List of Possible Moves
-        possible = [(row, col) for row in range(3) for col in range(3) if board[row, col] == '']
+        possible = state.legal_moves()
+        
+        # Reuse a previous search of this position (or a symmetric one), stored from the opponent's point of view
+        entry = self.table.probe(state)
+        if entry is not None and entry[1] == EXACT and entry[3] >= depth: return -entry[0], entry[2]
+        
+        # One move from the horizon, score every move at once with the learned evaluation
+        if depth == 1 and self.evaluator is not None: return self.leafValues(state, possible, False)
         
         # Initialize the Maximum Value to Negative Infinity
         min_val = math.inf
-        min_row, min_col = None, None
-        symbol = self.opponent.symbol
+        min_cell = None
         
         # Find the Best Move
-        for row, col in possible:
+        for cell in possible:
             
             # Simulate the Move
-            new_board = deepcopy(board)
-            new_board[row, col] = symbol
+            state.make(cell)
             
             # Check if player has won
-            winner = self.check_winner(new_board, symbol)
-            if winner == 'Win': return -50, row, col
-            if winner == 'Tie': return self.evaluate(new_board), row, col
+            winner = check_winner(state, cell)
+            if winner == 'Tie': value = self.evaluate(state); state.unmake(cell); return value, cell
+            if winner is not None: state.unmake(cell); return -win_score(state), cell
             
             # Get the Maximum Value
-            value, _, _ = self.maxValue(new_board)
-            if value < min_val: min_val, min_row, min_col = value, row, col
+            value, _ = self.maxValue(state, depth - 1)
+            state.unmake(cell)
+            if value < min_val: min_val, min_cell = value, cell
             
-        return min_val, min_row, min_col
+        self.table.store(state, -min_val, EXACT, min_cell, depth)
+        return min_val, min_cell
 
 
-    def evaluate(self, board):
+    def leafValues(self, state, possible, maximizing):
         
-        # Initialize Utility for Self Player and Opponent Player
-        self_util, opp_util = 0, 0
-        
-        # Utility of Middle Piece
-        for row, col in [(1,1)]:
-            if board[row, col] == self.symbol: self_util += 10
-            else: opp_util += 10
+        # Predicted scores of every move in one batch, scaled below the value of a win
+        scale = win_score(state) - 1
+        values = (2 * self.evaluator.children(state, possible, self.symbol) - 1) * scale
+        best_val, best_cell = None, None
+        for cell, value in zip(possible, values):
             
-        # Utility of Corner Pieces
-        for row, col in [(0,0), (0,2), (2,0), (2,2)]:
-            if board[row, col] == self.symbol: self_util += 5
-            else: opp_util += 5
+            # Wins end the search as usual, and a full board is a draw
+            state.make(cell)
+            winner = check_winner(state, cell)
+            state.unmake(cell)
+            if winner == 'Tie': value = 0.0
+            elif winner is not None: return (win_score(state) if maximizing else -win_score(state)), cell
+            if best_val is None or (value > best_val if maximizing else value < best_val): best_val, best_cell = float(value), cell
             
-        # Utility of Corner Pieces
-        for row, col in [(0,1), (1,0), (1,2), (2,1)]:
-            if board[row, col] == self.symbol: self_util += 1
-            else: opp_util += 1
+        self.table.store(state, best_val if maximizing else -best_val, EXACT, best_cell, 1)
+        return best_val, best_cell
+
+
+    def evaluate(self, state):
+        
+        # Use the learned evaluation when one is loaded, a finished game being a draw
+        if self.evaluator is not None:
+            if state.is_full(): return 0.0
+            return (2 * self.evaluator.evaluate(state, self.symbol) - 1) * (win_score(state) - 1)
+        
+        # Utility of each player's pieces, weighted by how many winning lines they can be part of
+        self_util, opp_util = 0, 0
+        mine = state.mask(self.symbol)
+        theirs = state.mask(self.opponent.symbol)
+        for weight, mask in weight_masks(state.rows, state.cols, state.k):
+            self_util += weight * bin(mine & mask).count('1')
+            opp_util += weight * bin(theirs & mask).count('1')
             
         # Return the Overall Utility
         return self_util - opp_util
         
-            
-    def check_winner(self, board, symbol):
-        
-        # Check the rows and columns
-        for i in range(3):
-            if np.all(board[i,:] == symbol) or np.all(board[:,i] == symbol): return 'Win'
-
-        # Check diagonals
-        if np.all(np.diag(board) == symbol) or np.all(np.diag(np.fliplr(board)) == symbol): return 'Win'
+    
+    def searchDepth(self, state):
+        if self.max_depth is not None: return self.max_depth
+        if state.rows * state.cols <= EXHAUSTIVE_CELLS: return len(state.legal_moves())
+        return DEFAULT_DEPTH
+        
+
+class TDAI(Player):
+
+    def __init__(self, symbol, values=None, explore=0.0, seed=None, shape=None):
+        import numpy as np
+        super().__init__(symbol)
+        
+        # values[i] is the learned score (1 win, 0.5 draw, 0 loss) of the player who moved into
+        # the positions of symmetry class i of indexing.PositionIndex, as trained by td.py for
+        # the (rows, cols, k) in shape
+        self.values = values
+        self.shape = shape
+        self.explore = explore
+        self.rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+
+    def table(self, rows, cols, k):
+        import numpy as np
+        from indexing import position_index
+        
+        # Untrained agents start from an even score for every position
+        if self.shape is not None and self.shape != (rows, cols, k):
+            raise ValueError(f"the value table was trained for {self.shape[0]}x{self.shape[1]} k={self.shape[2]}, not {rows}x{cols} k={k}")
+        index = position_index(rows, cols)
+        if self.values is None: self.values, self.shape = np.full(index.count, 0.5, dtype=np.float32), (rows, cols, k)
+        if len(self.values) != index.count: raise ValueError(f"the value table was not trained on a {rows}x{cols} board")
+        return index, self.values
 
-        # Check for a tie (if there are no empty cells left)
-        if np.all(board != ''): return 'Tie'
+    def play(self, env):
+        state = env.getView()
+        index, values = self.table(state.rows, state.cols, state.k)
+        
+        # Score every move by the table entry of the position it leads to, or by its result if it ends the game
+        moves = state.legal_moves()
+        scores = []
+        for cell in moves:
+            child = state.copy()
+            child.make(cell)
+            result = check_winner(child, cell)
+            if result is None: scores.append(values[index.index(child.x, child.o)])
+            else: scores.append(0.5 if result == 'Tie' else 1.0)
+        if self.explore and self.rng.random() < self.explore: return state.rowcol(moves[self.rng.integers(len(moves))])
+        return state.rowcol(moves[max(range(len(moves)), key=scores.__getitem__)])
+
+    def afterstates(self, env, games):
+        """
+        Description:
+            - Scores every move of a batch of games by the position it leads to
+
+        Parameters:
+            - env (batch.BatchGame) : The games
+            - games (np.ndarray) : Indexes of the unfinished games to move in
+
+        Returns:
+            - (scores, classes, results) (games, cells) arrays: the score of each move for the
+              player making it (-1 for occupied cells), the symmetry class of the position it
+              leads to, and 1 for a winning move, 0.5 for one that fills the board without a
+              winner and 0 otherwise
+        """
+        import numpy as np
+        from batch import cell_lines
+        index, values = self.table(env.rows, env.cols, env.k)
+        boards, players = env.boards[games], env.to_move[games]
+        empty = boards == 0
+        
+        # Classes of all children at once: each row of children is a board with one more piece
+        children = np.repeat(boards[:, None, :], env.cells, axis=1)
+        cells = np.arange(env.cells)
+        children[:, cells, cells] = players[:, None]
+        children = np.where(empty[:, :, None], children, 0).reshape(-1, env.cells)
+        classes = index.classes[index.ranks(children)].reshape(len(games), env.cells)
+        
+        # A move wins if a line through its cell already holds k - 1 of the player's pieces
+        through = cell_lines(env.rows, env.cols, env.k)
+        mine = (boards == players[:, None])[:, env.lines].sum(axis=2)
+        wins = ((mine[:, through] == env.k - 1) & (through >= 0)).any(axis=2) & empty
+        full = (env.plies[games] + 1 == env.cells)[:, None] & empty
+        results = np.where(wins, 1.0, np.where(full, 0.5, 0.0))
+        scores = np.where(wins | full, results, values[classes])
+        return np.where(empty, scores, -1.0), classes, results
+
+    def choose(self, scores):
+        import numpy as np
+        
+        # The best move of every game, or a random one with probability explore
+        if self.explore:
+            random_scores = np.where(scores >= 0, self.rng.random(scores.shape), -1.0)
+            scores = np.where(self.rng.random(len(scores))[:, None] < self.explore, random_scores, scores)
+        return scores.argmax(axis=1)
+
+    def play_batch(self, env, games):
+        return self.choose(self.afterstates(env, games)[0])
 
-        # If no winner and no tie, the game continues
-        return None
-            
-        
 
 class AlphaBetaAI(Player):
 
+    def __init__(self, symbol, table=None, book=None, max_depth=None, time_limit=None, ponder=False, evaluator=None):
+        super().__init__(symbol)
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.ponder = ponder
+        self.evaluator = evaluator
+        
+        # Values of a learned evaluation must not mix with those of the positional one in the shared
+        # table, and a pondering agent writes to its table from a background thread while the other
+        # agent searches, so both get a table of their own
+        if table is None: table = shared_table if evaluator is None and not ponder else TranspositionTable(shared_table.max_entries)
+        self.table = table
+        self.book = book
+        self.stats = {'depth': 0, 'nodes': 0, 'cutoffs': 0, 'time': 0.0}
+        self.deadline, self.iteration = None, 0
+        self.nodes, self.cutoffs = 0, 0
+        self.killers, self.history_scores = {}, ({}, {})
+
     def play(self, env):
-        board = env.getBoard()
-        alpha, beta = -math.inf, math.inf
-        value, row, col = self.maxValue(board, alpha, beta)
-        return row, col
+        state = env.getView()
+        self.stop()
+        
+        # Play straight from the solved table when one is loaded
+        if self.book is not None:
+            cell = self.book.best_move(state)
+            if cell is not None: self.publish(book_hits=1); return state.rowcol(cell)
+            
+        # Iterative deepening: each iteration seeds the move ordering of the next through the
+        # transposition table, killer moves and history scores
+        start = time.perf_counter()
+        self.deadline = None if self.time_limit is None else start + self.time_limit
+        self.nodes, self.cutoffs, hits = 0, 0, self.table.hits
+        self.killers = {}
+        self.history_scores = ({}, {})
+        best_cell, reached = state.legal_moves()[0], 0
+        search = state.copy()
+        for depth in range(1, self.searchDepth(state) + 1):
+            self.iteration = depth
+            alpha, beta = -math.inf, math.inf
+            try: value, cell = self.maxValue(search, alpha, beta, depth)
+            except SearchTimeout: break
+            best_cell, reached = cell, depth
+            
+            # Stop once the game is decided within the horizon
+            if abs(value) >= win_score(state): break
+            
+        self.stats = {'depth': reached, 'nodes': self.nodes, 'cutoffs': self.cutoffs, 'time': time.perf_counter() - start}
+        self.publish(nodes=self.nodes, depth=reached, cutoffs=self.cutoffs, tt_hits=self.table.hits - hits)
+        if self.ponder: self.ponderReplies(state, best_cell)
+        return state.rowcol(best_cell)
+
+
+    def ponderReplies(self, state, cell):
+        
+        # While the opponent thinks, deepen a search of every reply it can make so the
+        # transposition table already holds the position we face next
+        state = state.copy()
+        state.make(cell)
+        if check_winner(state, cell) is not None or state.is_full(): return
+        self.deadline = math.inf
+        self.killers, self.history_scores = {}, ({}, {})
+        def work(stop):
+            replies = state.legal_moves()
+            for depth in range(1, max(self.searchDepth(state), 1)):
+                self.iteration = depth
+                for reply in replies:
+                    if stop.is_set(): return
+                    child = state.copy()
+                    child.make(reply)
+                    if check_winner(child, reply) is not None: continue
+                    try: self.maxValue(child, -math.inf, math.inf, depth)
+                    except SearchTimeout: return
+        self.startPondering(work)
+
+
+    def stop(self):
+        
+        # Make a pondering search give up at its next deadline check
+        if self.ponder_thread is not None: self.deadline = -math.inf
+        super().stop()
         
     
-    def maxValue(self, board, alpha, beta):
+    def maxValue(self, state, alpha, beta, depth):
+        
+        # Give up if the time budget has run out (the first iteration always completes). A node can take
+        # a millisecond on a large board, so the clock is read at every one
+        self.nodes += 1
+        if self.deadline is not None and self.iteration > 1 and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+        
+        # At the search horizon, fall back to the positional evaluation
+        if depth == 0: return self.evaluate(state), None
         
         # Get the List of Possible Moves
-        possible = [(row, col) for row in range(3) for col in range(3) if board[row, col] == '']
+        possible = state.legal_moves()
+        
+        # Narrow the window with a previous search of this position (or a symmetric one)
+        alpha_orig = alpha
+        entry = self.table.probe(state)
+        if entry is not None and entry[3] >= depth:
+            value, flag, cell, _ = entry
+            if flag == EXACT: return value, cell
+            if flag == LOWER: alpha = max(alpha, value)
+            elif flag == UPPER: beta = min(beta, value)
+            if alpha >= beta: return value, cell
+        
+        # One move from the horizon, score every move at once with the learned evaluation
+        if depth == 1 and self.evaluator is not None: return self.leafValues(state, possible, True)
+        
+        # Search the previous best move first, then killer moves, then by history score
+        self.orderMoves(state, possible, None if entry is None else entry[2])
         
         # Initialize the Maximum Value to Negative Infinity
         max_val = -math.inf
-        max_row, max_col = None, None
-        symbol = self.symbol
+        max_cell = None
         
         # Find the Best Move
-        for row, col in possible:
+        for cell in possible:
             
             # Simulate the Move
-            new_board = deepcopy(board)
-            new_board[row, col] = symbol
+            state.make(cell)
             
             # Check if player has won
-            winner = self.check_winner(new_board, symbol)
-            if winner == 'Win': return 50, row, col
-            if winner == 'Tie': return self.evaluate(new_board), row, col
+            winner = check_winner(state, cell)
+            if winner == 'Tie': value = self.evaluate(state); state.unmake(cell); return value, cell
+            if winner is not None: state.unmake(cell); return win_score(state), cell
             
             # Get the Maximum Value
-            value, _, _ = self.minValue(new_board, alpha, beta)
-            if value > max_val: max_val, max_row, max_col = value, row, col
+            value, _ = self.minValue(state, alpha, beta, depth - 1)
+            state.unmake(cell)
+            if value > max_val: max_val, max_cell = value, cell
             
             # Alpha-Beta Pruning
-            if value >= beta: return value, row, col
+            if value >= beta:
+                self.recordCutoff(state, cell, depth)
+                self.table.store(state, value, LOWER, cell, depth)
+                return value, cell
             alpha = max(alpha, value)
             
-        return max_val, max_row, max_col
+        self.table.store(state, max_val, UPPER if max_val <= alpha_orig else EXACT, max_cell, depth)
+        return max_val, max_cell
         
     
-    def minValue(self, board, alpha, beta):
+    def minValue(self, state, alpha, beta, depth):
     
+        # Give up if the time budget has run out (the first iteration always completes)
+        self.nodes += 1
+        if self.deadline is not None and self.iteration > 1 and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+        
+        # At the search horizon, fall back to the positional evaluation
+        if depth == 0: return self.evaluate(state), None
+        
         # Get the List of Possible Moves
-        possible = [(row, col) for row in range(3) for col in range(3) if board[row, col] == '']
+        possible = state.legal_moves()
+        
+        # Narrow the window with a previous search of this position (or a symmetric one),
+        # stored from the opponent's point of view so its bounds are flipped
+        beta_orig = beta
+        entry = self.table.probe(state)
+        if entry is not None and entry[3] >= depth:
+            value, flag, cell, _ = entry
+            value = -value
+            if flag == EXACT: return value, cell
+            if flag == LOWER: beta = min(beta, value)
+            elif flag == UPPER: alpha = max(alpha, value)
+            if alpha >= beta: return value, cell
+        
+        # One move from the horizon, score every move at once with the learned evaluation
+        if depth == 1 and self.evaluator is not None: return self.leafValues(state, possible, False)
+        
+        # Search the previous best move first, then killer moves, then by history score
+        self.orderMoves(state, possible, None if entry is None else entry[2])
         
         # Initialize the Maximum Value to Negative Infinity
         min_val = math.inf
-        min_row, min_col = None, None
-        symbol = self.opponent.symbol
+        min_cell = None
         
         # Find the Best Move
-        for row, col in possible:
+        for cell in possible:
             
             # Simulate the Move
-            new_board = deepcopy(board)
-            new_board[row, col] = symbol
+            state.make(cell)
             
             # Check if player has won
-            winner = self.check_winner(new_board, symbol)
-            if winner == 'Win': return -50, row, col
-            if winner == 'Tie': return self.evaluate(new_board), row, col
+            winner = check_winner(state, cell)
+            if winner == 'Tie': value = self.evaluate(state); state.unmake(cell); return value, cell
+            if winner is not None: state.unmake(cell); return -win_score(state), cell
             
             # Get the Maximum Value
-            value, _, _ = self.maxValue(new_board, alpha, beta)
-            if value < min_val: min_val, min_row, min_col = value, row, col
+            value, _ = self.maxValue(state, alpha, beta, depth - 1)
+            state.unmake(cell)
+            if value < min_val: min_val, min_cell = value, cell
             
             # Alpha-Beta Pruning
-            if value <= alpha: return value, row, col
+            if value <= alpha:
+                self.recordCutoff(state, cell, depth)
+                self.table.store(state, -value, LOWER, cell, depth)
+                return value, cell
             beta = min(beta, value)
             
-        return min_val, min_row, min_col
+        self.table.store(state, -min_val, UPPER if min_val >= beta_orig else EXACT, min_cell, depth)
+        return min_val, min_cell
 
 
-    def evaluate(self, board):
+    def orderMoves(self, state, possible, first):
+        ply = state.rows * state.cols - state.empty_count
+        killers = self.killers.get(ply, ())
+        history = self.history_scores[state.turn]
+        possible.sort(key=lambda cell: (cell != first, cell not in killers, -history.get(cell, 0)))
+
+
+    def recordCutoff(self, state, cell, depth):
         
-        # Initialize Utility for Self Player and Opponent Player
-        self_util, opp_util = 0, 0
+        # Remember the refutation as a killer move at this ply and credit its history score
+        self.cutoffs += 1
+        ply = state.rows * state.cols - state.empty_count
+        killers = self.killers.setdefault(ply, [])
+        if cell not in killers:
+            killers.insert(0, cell)
+            del killers[2:]
+        history = self.history_scores[state.turn]
+        history[cell] = history.get(cell, 0) + depth * depth
+
+
+    def leafValues(self, state, possible, maximizing):
         
-        # Utility of Middle Piece
-        for row, col in [(1,1)]:
-            if board[row, col] == self.symbol: self_util += 10
-            else: opp_util += 10
+        # Predicted scores of every move in one batch, scaled below the value of a win
+        scale = win_score(state) - 1
+        values = (2 * self.evaluator.children(state, possible, self.symbol) - 1) * scale
+        best_val, best_cell = None, None
+        for cell, value in zip(possible, values):
             
-        # Utility of Corner Pieces
-        for row, col in [(0,0), (0,2), (2,0), (2,2)]:
-            if board[row, col] == self.symbol: self_util += 5
-            else: opp_util += 5
+            # Wins end the search as usual, and a full board is a draw
+            state.make(cell)
+            winner = check_winner(state, cell)
+            state.unmake(cell)
+            if winner == 'Tie': value = 0.0
+            elif winner is not None: return (win_score(state) if maximizing else -win_score(state)), cell
+            if best_val is None or (value > best_val if maximizing else value < best_val): best_val, best_cell = float(value), cell
             
-        # Utility of Corner Pieces
-        for row, col in [(0,1), (1,0), (1,2), (2,1)]:
-            if board[row, col] == self.symbol: self_util += 1
-            else: opp_util += 1
+        self.table.store(state, best_val if maximizing else -best_val, EXACT, best_cell, 1)
+        return best_val, best_cell
+
+
+    def evaluate(self, state):
+        
+        # Use the learned evaluation when one is loaded, a finished game being a draw
+        if self.evaluator is not None:
+            if state.is_full(): return 0.0
+            return (2 * self.evaluator.evaluate(state, self.symbol) - 1) * (win_score(state) - 1)
+        
+        # Utility of each player's pieces, weighted by how many winning lines they can be part of
+        self_util, opp_util = 0, 0
+        mine = state.mask(self.symbol)
+        theirs = state.mask(self.opponent.symbol)
+        for weight, mask in weight_masks(state.rows, state.cols, state.k):
+            self_util += weight * bin(mine & mask).count('1')
+            opp_util += weight * bin(theirs & mask).count('1')
             
         # Return the Overall Utility
         return self_util - opp_util
         
-            
-    def check_winner(self, board, symbol):
-        
-        # Check the rows and columns
-        for i in range(3):
-            if np.all(board[i,:] == symbol) or np.all(board[:,i] == symbol): return 'Win'
+    
+    def searchDepth(self, state):
+        if self.max_depth is not None: return self.max_depth
+        if state.rows * state.cols <= EXHAUSTIVE_CELLS or self.time_limit is not None: return len(state.legal_moves())
+        return DEFAULT_DEPTH
 
-        # Check diagonals
-        if np.all(np.diag(board) == symbol) or np.all(np.diag(np.fliplr(board)) == symbol): return 'Win'
 
-        # Check for a tie (if there are no empty cells left)
-        if np.all(board != ''): return 'Tie'
+class ThreatSpaceAI(AlphaBetaAI):
 
-        # If no winner and no tie, the game continues
-        return None
+    def __init__(self, symbol, max_nodes=20000, **kwargs):
+        super().__init__(symbol, **kwargs)
+        self.max_nodes = max_nodes
+        self.forced = None
+
+    def play(self, env):
+        from threats import ThreatBoard, ThreatSearch
+        state = env.getView()
+        self.stop()
+
+        # Look for a forced win through fours and threes before searching every move, in at
+        # most half of the time limit including the time to set up the line counts
+        start = time.perf_counter()
+        board = ThreatBoard(state)
+        threat_time = None if self.time_limit is None else max(0.0, self.time_limit / 2 - (time.perf_counter() - start))
+        search = ThreatSearch(board, self.max_nodes, threat_time)
+        self.forced = search.find()
+        self.publish(threat_nodes=search.nodes)
+        if self.forced is not None:
+            cell, moves = self.forced
+            self.stats = {'depth': 2 * moves - 1, 'nodes': search.nodes, 'cutoffs': 0, 'time': time.perf_counter() - start}
+            if self.ponder: self.ponderReplies(state, cell)
+            return state.rowcol(cell)
+
+        # No forcing sequence: fall back to the alpha-beta search in the time that is left
+        time_limit = self.time_limit
+        if time_limit is not None: self.time_limit = max(0.0, time_limit - (time.perf_counter() - start))
+        try: return super().play(env)
+        finally: self.time_limit = time_limit
@@ -0,0 +1,219 @@
+import argparse
+import os
+import struct
+from collections import namedtuple
+import numpy as np
+from bitboard import Bitboard
+from rules import check_winner
+
+# File layout: MAGIC and the format version, then a stream of tagged records. An agent record
+# (b'A', id, name length, name) names an agent the first time it is used, and a game record
+# (b'G', GAME header, one byte per move) stores a game as the cells played in order.
+MAGIC = b'TTTR'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sH')
+AGENT = struct.Struct('<BB')  # agent id, name length
+GAME = struct.Struct('<BBBBHQBB')  # rows, cols, k, result, number of moves, seed, X agent id, O agent id
+AGENT_TAG, GAME_TAG = b'A'[0], b'G'[0]
+RESULTS = ('Tie', 'X', 'O', None)  # Result codes, None for a game that was not finished
+MAX_CELLS = 256  # Largest board whose cells fit in a byte
+SEED_MASK = 2**64 - 1  # Seeds are stored as unsigned 64-bit numbers
+
+def check_shape(rows, cols):
+    """
+    Description:
+        - Checks that games on a board can be recorded, so a program can refuse -record
+          before it plays any game
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+
+    Returns:
+        - None. Raises ValueError if the board is too large
+    """
+    if rows * cols > MAX_CELLS: raise ValueError(f"boards larger than {MAX_CELLS} cells cannot be recorded")
+
+
+GameRecord = namedtuple('GameRecord', ['rows', 'cols', 'k', 'winner', 'seed', 'x', 'o', 'moves'])
+
+
+class RecordWriter:
+    def __init__(self, path):
+        """
+        Description:
+            - Appends games to a record file, creating it if needed. Every game is written as
+              soon as it is recorded, so a file is complete up to the last game even if the
+              program stops.
+
+        Parameters:
+            - path (str) : The record file
+        """
+        self.path = path
+        self.agent_ids = {}
+        if os.path.exists(path) and os.path.getsize(path):
+            records = GameRecords(path)
+            self.agent_ids = {name: i for i, name in enumerate(records.agents)}
+            end = records.end
+            del records
+
+            # Drop a record cut short by a writer that was stopped, so new games follow complete ones
+            self.file = open(path, 'r+b')
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    def agent_id(self, name):
+        if name not in self.agent_ids:
+            if len(self.agent_ids) == 256: raise ValueError(f"{self.path} already names 256 agents")
+            encoded = name.encode()
+            self.agent_ids[name] = len(self.agent_ids)
+            self.file.write(bytes([AGENT_TAG]) + AGENT.pack(self.agent_ids[name], len(encoded)) + encoded)
+        return self.agent_ids[name]
+
+    def write(self, rows, cols, k, x, o, seed, winner, moves):
+        """
+        Description:
+            - Appends a game
+
+        Parameters:
+            - rows (int) : Number of rows on the board
+            - cols (int) : Number of columns on the board
+            - k (int) : Number of cells in a row needed to win
+            - x (str) : Name of the agent playing X
+            - o (str) : Name of the agent playing O
+            - seed (int) : Seed the game was played with, or None. Stored modulo 2**64
+            - winner (str) : 'X', 'O', 'Tie' or None
+            - moves : The cells played, in order
+
+        Returns:
+            - None
+        """
+        check_shape(rows, cols)
+        x_id, o_id = self.agent_id(x), self.agent_id(o)
+        moves = bytes(moves)
+        header = GAME.pack(rows, cols, k, RESULTS.index(winner), len(moves), 0 if seed is None else seed & SEED_MASK, x_id, o_id)
+        self.file.write(bytes([GAME_TAG]) + header + moves)
+        self.file.flush()
+
+    def on_game_over(self, game, winner):
+        """
+        Description:
+            - Observer hook called by TicTacToe once a game it records has concluded
+
+        Parameters:
+            - game (TicTacToe) : The game that has concluded
+            - winner : 'Tie' or the winning player
+
+        Returns:
+            - None
+        """
+        self.write(game.state.rows, game.state.cols, game.state.k, type(game.player1).__name__, type(game.player2).__name__,
+                   game.seed, 'Tie' if winner == 'Tie' else winner.symbol, game.moves)
+
+    def close(self):
+        self.file.close()
+
+
+class GameRecords:
+    def __init__(self, path):
+        """
+        Description:
+            - Memory-maps a record file. Opening it indexes where each game starts; the moves
+              are only read from disk when a game is accessed.
+
+        Parameters:
+            - path (str) : The record file
+        """
+        self.path = path
+        self.raw = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) else np.zeros(0, np.uint8)
+        if len(self.raw) < FILE_HEADER.size or FILE_HEADER.unpack_from(self.raw)[0] != MAGIC:
+            raise ValueError(f"{path} is not a game record file")
+        version = FILE_HEADER.unpack_from(self.raw)[1]
+        if version != VERSION: raise ValueError(f"{path} has version {version}, expected {VERSION}")
+        self.agents, offsets = [], []
+        raw, offset, end = self.raw, FILE_HEADER.size, len(self.raw)
+        while offset < end:
+            tag = raw[offset]
+            if tag == GAME_TAG and offset + 1 + GAME.size <= end:
+                moves = GAME.unpack_from(raw, offset + 1)[4]
+                if offset + 1 + GAME.size + moves > end: break
+                offsets.append(offset + 1)
+                offset += 1 + GAME.size + moves
+            elif tag == AGENT_TAG and offset + 1 + AGENT.size <= end:
+                agent, length = AGENT.unpack_from(raw, offset + 1)
+                if agent != len(self.agents): raise ValueError(f"{path} is corrupt at byte {offset}")
+                self.agents.append(bytes(raw[offset + 1 + AGENT.size:offset + 1 + AGENT.size + length]).decode())
+                offset += 1 + AGENT.size + length
+            elif tag in (GAME_TAG, AGENT_TAG): break  # A record cut short by a writer that was stopped
+            else: raise ValueError(f"{path} is corrupt at byte {offset}")
+        self.end = offset  # End of the last complete record
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        """
+        Description:
+            - Reads a game
+
+        Parameters:
+            - index (int) : The game number
+
+        Returns:
+            - A GameRecord. moves is a read-only uint8 array of cells that views the file.
+        """
+        offset = int(self.offsets[index])
+        rows, cols, k, result, length, seed, x, o = GAME.unpack_from(self.raw, offset)
+        start = offset + GAME.size
+        return GameRecord(rows, cols, k, RESULTS[result], seed, self.agents[x], self.agents[o], self.raw[start:start + length])
+
+    def __iter__(self):
+        for index in range(len(self.offsets)): yield self[index]
+
+
+def replay(record):
+    """
+    Description:
+        - Plays a recorded game back, checking every move is legal and the recorded result
+
+    Parameters:
+        - record (GameRecord) : The game
+
+    Returns:
+        - The list of Bitboard positions after each move
+    """
+    state = Bitboard(record.rows, record.cols, record.k)
+    positions = []
+    for cell in record.moves:
+        cell = int(cell)
+        if cell >= record.rows * record.cols or not state.is_empty(cell): raise ValueError(f"illegal move {cell} in {record}")
+        state.make(cell)
+        positions.append(state.copy())
+    result = check_winner(state) if positions else None
+    if record.winner is not None and result != record.winner: raise ValueError(f"recorded result {record.winner} does not match the moves ({result})")
+    return positions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize and check a game record file')
+    parser.add_argument('path', type=str, help='The record file')
+    parser.add_argument('-show', default=0, type=int, help='Number of games to print')
+    args = parser.parse_args()
+
+    records = GameRecords(args.path)
+    results = {}
+    for record in records:
+        replay(record)
+        key = (record.x, record.o)
+        results.setdefault(key, {'X': 0, 'O': 0, 'Tie': 0, None: 0})[record.winner] += 1
+    print(f"{len(records)} games, all replayed without errors")
+    for (x, o), counts in sorted(results.items()):
+        print(f"{x} (X) vs {o} (O): X wins: {counts['X']}, O wins: {counts['O']}, Ties: {counts['Tie']}")
+    for index in range(min(args.show, len(records))):
+        record = records[index]
+        print(f"{record.x} vs {record.o}, {record.rows}x{record.cols} k={record.k}, seed {record.seed}, "
+              f"result {record.winner}: {[divmod(int(cell), record.cols) for cell in record.moves]}")
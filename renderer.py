@@ -0,0 +1,244 @@
+import sys
+import threading
+import time
+import pygame
+
+class PygameRenderer:
+    def __init__(self, board_shape=(3,3), max_size=720, fps=30):
+        """
+        Description:
+            - Pygame Window that Observes a TicTacToe Game and Draws its Moves. The window
+              only wakes up for events or to redraw the cells that changed, at most fps
+              times a second, so it uses next to no CPU while it waits.
+
+        Parameters:
+            - board_shape : The shape of the board. 3x3 by default
+            - max_size (int) : The largest side of the Pygame window in pixels
+            - fps (int) : Most redraws per second
+        """
+        self.rows, self.cols = board_shape
+        self.cell_size = max(16, min(100, max_size // max(self.rows, self.cols)))
+        self.width = self.cols * self.cell_size  # Size of the Pygame window
+        self.height = self.rows * self.cell_size
+        self.bg_color = (255, 255, 255)  # White
+        self.line_color = (0, 0, 0)  # Black
+        self.x_color = (255, 0, 0) # Red
+        self.o_color = (0, 0, 255) # Blue
+        self.fps = fps
+        self.dirty = []  # Screen areas drawn on since the last redraw
+        self.clock = None
+        self.game_over = False
+        self.idle_wall = self.idle_cpu = 0.0  # Time spent waiting for input, and the CPU used meanwhile
+        pygame.init()
+        self.screen = pygame.display.set_mode((self.width, self.height))
+        pygame.display.set_caption("Tic Tac Toe")
+        self.screen.fill(self.bg_color)
+        self.draw_board()
+
+    def draw_board(self):
+        """
+        Description:
+            - Creates the TicTacToe Game Board
+
+        Parameters:
+            - None
+
+        Returns:
+            - None
+        """
+        for row in range(1, self.rows):
+            pygame.draw.line(self.screen, self.line_color, (0, row * self.cell_size), (self.width, row * self.cell_size), 2)
+        for col in range(1, self.cols):
+            pygame.draw.line(self.screen, self.line_color, (col * self.cell_size, 0), (col * self.cell_size, self.height), 2)
+        pygame.display.update()
+
+    def draw_move(self, row, col, symbol):
+        """
+        Description:
+            - Draws a Move on the Pygame Board
+
+        Parameters:
+            - row (int) : The row to make the move on
+            - col (int) : The column to make the move on
+            - symbol (str) : The symbol of the player making the move
+
+        Returns:
+            - None
+        """
+        centerX = col * self.cell_size + self.cell_size // 2
+        centerY = row * self.cell_size + self.cell_size // 2
+        radius = self.cell_size * 2 // 5
+        width = max(2, self.cell_size // 20)
+        if symbol == 'X':
+            pygame.draw.line(self.screen, self.x_color, (centerX - radius, centerY - radius), (centerX + radius, centerY + radius), width)
+            pygame.draw.line(self.screen, self.x_color, (centerX + radius, centerY - radius), (centerX - radius, centerY + radius), width)
+        else:
+            pygame.draw.circle(self.screen, self.o_color, (centerX, centerY), radius, width)
+        self.dirty.append(pygame.Rect(col * self.cell_size, row * self.cell_size, self.cell_size, self.cell_size))
+        self.flush()
+
+    def flush(self):
+        """
+        Description:
+            - Copies the cells drawn since the last redraw to the window, waiting first if the
+              last redraw was less than a frame ago
+
+        Parameters:
+            - None
+
+        Returns:
+            - None
+        """
+        if not self.dirty: return
+        if self.clock is None: self.clock = pygame.time.Clock()
+        self.clock.tick(self.fps)
+        pygame.display.update(self.dirty)
+        self.dirty = []
+
+    def handle(self, event):
+        # Quit if the window was closed, otherwise return the event to the caller
+        if event.type == pygame.QUIT: self.quit(None if self.game_over else "User Terminated the Game")
+        return event
+
+    def wait(self, timeout=None):
+        """
+        Description:
+            - Sleeps until a window event arrives or timeout has passed. Waits without a
+              timeout are waits for the user, and the CPU used during them is counted as idle use.
+
+        Parameters:
+            - timeout (float) : Seconds to wait at most, or None to wait for an event
+
+        Returns:
+            - The event, or None if the wait timed out
+        """
+        if timeout is not None: event = pygame.event.wait(max(1, int(timeout * 1000)))
+        else:
+            wall, cpu = time.perf_counter(), time.process_time()
+            event = pygame.event.wait()
+            self.idle_wall += time.perf_counter() - wall
+            self.idle_cpu += time.process_time() - cpu
+        return None if event.type == pygame.NOEVENT else self.handle(event)
+
+    def wait_for_click(self, is_legal):
+        """
+        Description:
+            - Waits for the user to click on a cell
+
+        Parameters:
+            - is_legal : Callable telling whether (row, col) can be played
+
+        Returns:
+            - (row, col) of the clicked cell
+        """
+        while True:
+            event = self.wait()
+            if event is not None and event.type == pygame.MOUSEBUTTONDOWN:
+                mouseX, mouseY = event.pos
+                row, col = mouseY // self.cell_size, mouseX // self.cell_size
+                if row < self.rows and col < self.cols and is_legal(row, col): return row, col
+
+    def run(self, work, caption=None):
+        """
+        Description:
+            - Runs work() in a background thread, such as an AI agent choosing its move, and
+              keeps handling window events until it has finished so the window stays responsive
+
+        Parameters:
+            - work : Callable to run
+            - caption (str) : Window title to show while it runs
+
+        Returns:
+            - What work() returned. Exceptions it raised are raised again here.
+        """
+        result = {}
+        def target():
+            try: result['value'] = work()
+            except BaseException as error: result['error'] = error
+        thread = threading.Thread(target=target, daemon=True)
+        if caption is not None: pygame.display.set_caption(caption)
+        thread.start()
+        while thread.is_alive():
+            self.wait(1 / self.fps)
+            thread.join(0)
+        if caption is not None: pygame.display.set_caption("Tic Tac Toe")
+        if 'error' in result: raise result['error']
+        return result['value']
+
+    def idle_cpu_percent(self):
+        # CPU used by the process while the window waited for input, as a share of one core
+        return 100 * self.idle_cpu / self.idle_wall if self.idle_wall else 0.0
+
+    def poll(self):
+        """
+        Description:
+            - Handles pending window events, quitting if the window was closed
+
+        Parameters:
+            - None
+
+        Returns:
+            - None
+        """
+        for event in pygame.event.get(): self.handle(event)
+
+    def quit(self, message=None):
+        """
+        Description:
+            - Closes the Pygame Window and Exits the Program
+
+        Parameters:
+            - message (str) : Optional message to print before exiting
+
+        Returns:
+            - None
+        """
+        pygame.quit()
+        if message: print(message)
+        if self.idle_wall: print(f"CPU use while waiting for input: {self.idle_cpu_percent():.1f}% of a core over {self.idle_wall:.1f}s")
+        sys.exit()
+
+    def on_move(self, game, row, col):
+        """
+        Description:
+            - Observer hook called by the game after a move has been placed
+
+        Parameters:
+            - game (TicTacToe) : The game the move was played in
+            - row (int) : The row the move was made on
+            - col (int) : The column the move was made on
+
+        Returns:
+            - None
+        """
+        self.draw_move(row, col, game.current_player.symbol)
+
+    def on_game_over(self, game, winner):
+        """
+        Description:
+            - Observer hook called by the game once it has concluded
+
+        Parameters:
+            - game (TicTacToe) : The game that has concluded
+            - winner : 'Tie' or the winning player
+
+        Returns:
+            - None
+        """
+        self.flush()
+        self.game_over = True
+        if winner == 'Tie': pygame.display.set_caption("Tic Tac Toe - Tie!")
+        else: pygame.display.set_caption(f"Tic Tac Toe - {winner.symbol} Wins!")
+
+    def wait_for_close(self):
+        """
+        Description:
+            - Keeps the final board on screen until the window is closed
+
+        Parameters:
+            - None
+
+        Returns:
+            - None
+        """
+        while True: self.wait()
@@ -0,0 +1,81 @@
+import numpy as np
+from rules import win_masks
+
+# Cell indexes of every winning line, one (lines, k) array per board shape
+_line_cells = {}
+
+def line_cells(rows, cols, k):
+    """
+    Description:
+        - Returns the cells of every winning line as a numpy index array
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A (lines, k) integer array
+    """
+    key = (rows, cols, k)
+    if key not in _line_cells:
+        cells = rows * cols
+        lines = [[cell for cell in range(cells) if mask >> cell & 1] for mask in win_masks(rows, cols, k)]
+        _line_cells[key] = np.array(lines, dtype=np.intp).reshape(len(lines), k)
+    return _line_cells[key]
+
+
+def random_playouts(state, first_move, n, rng, batch_size=4096):
+    """
+    Description:
+        - Plays n uniformly random games from state after first_move, all at once. Each game
+          is a random permutation of the empty cells, played alternately starting with the
+          opponent. Rather than replaying the games move by move, every winning line is
+          checked for being owned by one player, and the ply at which it was completed is
+          the latest ply among its cells. The game ends at the first completed line.
+
+    Parameters:
+        - state (Bitboard) : The position to play from. It is not modified
+        - first_move (int) : The cell played by the player to move before the random games start
+        - n (int) : Number of games to play
+        - rng (np.random.Generator) : Source of randomness
+        - batch_size (int) : Maximum number of games simulated per array operation
+
+    Returns:
+        - An int8 array of n results from the point of view of the player to move in state:
+          1 for a win, -1 for a loss and 0 for a tie
+    """
+    cells = state.rows * state.cols
+    lines = line_cells(state.rows, state.cols, state.k)
+    mine = state.mask(state.symbol) | 1 << first_move
+    theirs = (state.x | state.o) & ~mine
+    empty = np.array([cell for cell in range(cells) if not (mine | theirs) >> cell & 1], dtype=np.intp)
+
+    # Stones already on the board were placed "before" the playout (ply -1)
+    base_owner = np.zeros(cells, dtype=np.int8)  # 0 empty, 1 mine, 2 theirs
+    for cell in range(cells):
+        if mine >> cell & 1: base_owner[cell] = 1
+        elif theirs >> cell & 1: base_owner[cell] = 2
+    never = cells + 1
+
+    results = np.empty(n, dtype=np.int8)
+    for start in range(0, n, batch_size):
+        size = min(batch_size, n - start)
+        ply = np.full((size, cells), -1, dtype=np.int16)
+        owner = np.broadcast_to(base_owner, (size, cells)).copy()
+        if len(empty):
+            order = rng.permuted(np.broadcast_to(np.arange(len(empty), dtype=np.int16), (size, len(empty))), axis=1)
+            ply[:, empty] = order
+            owner[:, empty] = np.where(order % 2 == 0, 2, 1)
+
+        # Ply at which each player first completes a line
+        line_owner = owner[:, lines]
+        finished = ply[:, lines].max(axis=2)
+        mine_done = np.where((line_owner == 1).all(axis=2), finished, never).min(axis=1)
+        theirs_done = np.where((line_owner == 2).all(axis=2), finished, never).min(axis=1)
+
+        batch = results[start:start + size]
+        batch[:] = 0
+        batch[mine_done < theirs_done] = 1
+        batch[theirs_done < mine_done] = -1
+    return results
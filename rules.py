@@ -0,0 +1,107 @@
+# Rules of k-in-a-row on a rows x cols board, shared by the game, the agents and the solver.
+# Positions are read through the Bitboard fields x, o (stone masks) and empty_count.
+
+# Win-line masks are computed once per board shape and shared by every position of that shape
+_win_masks = {}
+
+def win_masks(rows, cols, k):
+    """
+    Description:
+        - Returns the bit masks of every line of k cells on a rows x cols board
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A tuple of integer masks, one per winning line
+    """
+    key = (rows, cols, k)
+    if key not in _win_masks:
+        masks = []
+        for row in range(rows):
+            for col in range(cols):
+                for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_col = row + dr * (k - 1), col + dc * (k - 1)
+                    if not (0 <= end_row < rows and 0 <= end_col < cols): continue
+                    mask = 0
+                    for i in range(k): mask |= 1 << ((row + dr * i) * cols + col + dc * i)
+                    masks.append(mask)
+        _win_masks[key] = tuple(masks)
+    return _win_masks[key]
+
+
+# For each cell, the win lines passing through it, again computed once per board shape
+_line_indexes = {}
+_lines_through = {}
+
+def line_indexes(rows, cols, k):
+    """
+    Description:
+        - Returns the indexes in win_masks of the lines passing through each cell
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A tuple with one tuple of ascending line indexes per cell
+    """
+    key = (rows, cols, k)
+    if key not in _line_indexes:
+        through = [[] for _ in range(rows * cols)]
+        for line, mask in enumerate(win_masks(rows, cols, k)):
+            while mask:
+                low = mask & -mask
+                through[low.bit_length() - 1].append(line)
+                mask ^= low
+        _line_indexes[key] = tuple(tuple(lines) for lines in through)
+    return _line_indexes[key]
+
+
+def lines_through(rows, cols, k):
+    """
+    Description:
+        - Returns the win-line masks passing through each cell, so a win can be detected
+          from the last move alone
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A tuple with one tuple of masks per cell
+    """
+    key = (rows, cols, k)
+    if key not in _lines_through:
+        masks = win_masks(rows, cols, k)
+        _lines_through[key] = tuple(tuple(masks[line] for line in lines) for lines in line_indexes(rows, cols, k))
+    return _lines_through[key]
+
+
+def check_winner(state, last=None):
+    """
+    Description:
+        - Determines the result of a position. Given the last move, only the lines through
+          that cell are checked, and a tie is read from the position's empty-cell count.
+
+    Parameters:
+        - state (Bitboard) : The position to check
+        - last (int) : The cell of the last move, or None to check every line
+
+    Returns:
+        - 'X' or 'O' if that player has won, 'Tie' if the board is full, None otherwise
+    """
+    if last is not None:
+        symbol = 'X' if state.x >> last & 1 else 'O'
+        stones = state.x if symbol == 'X' else state.o
+        for mask in lines_through(state.rows, state.cols, state.k)[last]:
+            if stones & mask == mask: return symbol
+    else:
+        for mask in win_masks(state.rows, state.cols, state.k):
+            if state.x & mask == mask: return 'X'
+            if state.o & mask == mask: return 'O'
+    return 'Tie' if state.empty_count == 0 else None
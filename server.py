@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import OrderedDict
+import transposition
+from agents import agents, add_agent_arguments, make_agent
+from bitboard import Bitboard
+from board import TicTacToe
+from parallel import get_pool
+from players import Player
+from rules import check_winner
+
+# Agents cheap enough to answer on the event loop. Every other agent searches in a worker process.
+INLINE_AGENTS = {'simpleAI', 'randomAI'}
+
+# Agents that keep to a time limit, the only ones that can be held to a request's deadline
+TIMED_AGENTS = {'alphaBetaAI', 'mctsAI', 'threatAI'}
+MAX_CELLS = 1024
+
+
+class ServiceError(Exception):
+    pass
+
+
+def parse_board(rows, k=None, turn=None):
+    """
+    Description:
+        - Builds a state from the board of a request
+
+    Parameters:
+        - rows (list) : One string per row, with 'X', 'O' and '.' (or ' ') for empty cells
+        - k (int) : Number in a row needed to win. Defaults to min(3, rows, columns)
+        - turn (str) : 'X' or 'O' to move. Inferred from the stone counts if None
+
+    Returns:
+        - A Bitboard
+    """
+    try: state = Bitboard.parse(rows, k, turn)
+    except ValueError as error: raise ServiceError(str(error))
+    if state.rows * state.cols > MAX_CELLS: raise ServiceError('unsupported board shape or k')
+    return state
+
+
+def format_board(state):
+    return [''.join('X' if state.x >> cell & 1 else 'O' if state.o >> cell & 1 else '.'
+                    for cell in range(row * state.cols, (row + 1) * state.cols)) for row in range(state.rows)]
+
+
+def choose_move(name, state, args, seed, end=None):
+    """
+    Description:
+        - Asks an agent for its move in a position. Runs in a worker process for searching agents.
+
+    Parameters:
+        - name (str) : The agent, a key of agents.agents
+        - state (Bitboard) : The position, with the agent to move
+        - args (argparse.Namespace) : The agent options of the server
+        - seed (int) : Seed of the agent's random choices
+        - end (float) : time.time() by which agents that keep to a time limit should have
+          answered, or None for no limit
+
+    Returns:
+        - (cell, counters) of the chosen move and the work the agent published, or None if
+          end had already passed when the request left the queue
+    """
+    random.seed(seed)
+    if end is not None:
+        budget = end - time.time()
+        if budget <= 0: return None
+        args = argparse.Namespace(**vars(args))
+        args.time = budget if args.time is None else min(args.time, budget)
+        args.mcts_time = budget if args.mcts_time is None else min(args.mcts_time, budget)
+    symbol = state.symbol
+    player = make_agent(name, symbol, args)
+    game = TicTacToe(player, Player('O' if symbol == 'X' else 'X'), board_shape=(state.rows, state.cols), k=state.k)
+    game.state = state
+    row, col = player.play(game)
+    return state.cell(row, col), player.counters
+
+
+class Session:
+    __slots__ = ('agent', 'state', 'lock', 'last_used')
+
+    def __init__(self, agent, state):
+        self.agent = agent
+        self.state = state
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class MoveServer:
+    def __init__(self, args):
+        """
+        Description:
+            - Serves AI moves over TCP to many clients at once. Each request and response is one
+              line of JSON. Searches run in a pool of worker processes, so the event loop stays
+              responsive; requests beyond what the pool can queue are rejected straight away.
+
+        Parameters:
+            - args (argparse.Namespace) : The parsed command line of this module
+        """
+        self.args = args
+        self.pool = get_pool(args.processes)
+        self.pending = 0
+        self.sessions = OrderedDict()
+        self.rng = random.Random(args.seed)
+        self.served = self.rejected = self.timeouts = 0
+
+    async def search(self, name, state, deadline=None):
+        """
+        Description:
+            - Gets an agent's move, in a worker process unless the agent is cheap
+
+        Parameters:
+            - name (str) : The agent
+            - state (Bitboard) : The position, with the agent to move
+            - deadline (float) : Seconds the request may take, or None for the server default
+
+        Returns:
+            - (cell, counters) of the chosen move
+        """
+        if name not in agents or name == 'human': raise ServiceError(f"unknown agent {name}")
+        if name not in INLINE_AGENTS | TIMED_AGENTS:
+            raise ServiceError(f"{name} cannot keep to a deadline, use one of {', '.join(sorted(INLINE_AGENTS | TIMED_AGENTS))}")
+        if state.is_full() or check_winner(state) is not None: raise ServiceError('the game is already over')
+        seed = self.rng.getrandbits(64)
+        if name in INLINE_AGENTS: return choose_move(name, state, self.args, seed)
+        if self.pending >= self.args.max_pending:
+            self.rejected += 1
+            raise ServiceError('server is busy, retry later')
+        deadline = self.args.deadline if deadline is None else min(float(deadline), self.args.deadline)
+
+        # The deadline includes the time spent queueing. Agents are asked to stop early enough for
+        # the reply to make it, and requests that expire in the queue are skipped. A search that
+        # misses the deadline still occupies its worker, so it stays pending until it finishes.
+        self.pending += 1
+        end = time.time() + deadline * 0.8
+        future = asyncio.get_running_loop().run_in_executor(self.pool, choose_move, name, state, self.args, seed, end)
+        future.add_done_callback(self.finished)
+        try: move = await asyncio.wait_for(asyncio.shield(future), deadline)
+        except asyncio.TimeoutError: move = None
+        if move is None:
+            self.timeouts += 1
+            raise ServiceError('deadline exceeded')
+        return move
+
+    def finished(self, future):
+        # Done callback of a search in the pool. Its result is only wanted if it came in time.
+        self.pending -= 1
+        if not future.cancelled(): future.exception()
+
+    def new_session(self, request):
+        """
+        Description:
+            - Starts a game against an agent, evicting the least recently used session when full
+
+        Parameters:
+            - request (dict) : {'agent', 'rows', 'cols', 'k'}
+
+        Returns:
+            - The response
+        """
+        rows, cols = int(request.get('rows', 3)), int(request.get('cols', 3))
+        if not (0 < rows and 0 < cols and rows * cols <= MAX_CELLS): raise ServiceError('unsupported board shape or k')
+        state = parse_board(['.' * cols] * rows, request.get('k'))
+        agent = request.get('agent', 'alphaBetaAI')
+        if agent not in agents or agent == 'human': raise ServiceError(f"unknown agent {agent}")
+        if agent not in INLINE_AGENTS | TIMED_AGENTS: raise ServiceError(f"{agent} cannot keep to a deadline")
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = Session(agent, state)
+        while len(self.sessions) > self.args.max_sessions: self.sessions.popitem(last=False)
+        return {'session': session_id, 'board': format_board(state)}
+
+    async def play(self, request):
+        """
+        Description:
+            - Plays the client's move (if any) in a session, then the agent's reply
+
+        Parameters:
+            - request (dict) : {'session', 'move': [row, col] or omitted, 'deadline'}
+
+        Returns:
+            - The response, with the agent's move (or None) and the result once the game is over
+        """
+        session = self.sessions.get(request.get('session'))
+        if session is None: raise ServiceError('unknown or expired session')
+        self.sessions.move_to_end(request['session'])
+        session.last_used = time.monotonic()
+        async with session.lock:
+
+            # Both moves are played on a copy, so a failed search leaves the session as it was
+            state = session.state.copy()
+            result, reply = check_winner(state), None
+            if 'move' in request and result is None:
+                row, col = request['move']
+                if not (0 <= row < state.rows and 0 <= col < state.cols and state.is_empty(state.cell(row, col))):
+                    raise ServiceError('illegal move')
+                state.make(state.cell(row, col))
+                result = check_winner(state, state.cell(row, col))
+            if result is None:
+                cell, counters = await self.search(session.agent, state.copy(), request.get('deadline'))
+                state.make(cell)
+                result, reply = check_winner(state, cell), list(state.rowcol(cell))
+            session.state = state
+        return {'move': reply, 'board': format_board(state), 'result': result}
+
+    async def handle(self, request):
+        op = request.get('op')
+        if op == 'move':
+            state = parse_board(request.get('board'), request.get('k'), request.get('turn'))
+            cell, counters = await self.search(request.get('agent', 'alphaBetaAI'), state, request.get('deadline'))
+            return {'move': list(state.rowcol(cell)), **counters}
+        if op == 'new': return self.new_session(request)
+        if op == 'play': return await self.play(request)
+        if op == 'close': return {'closed': self.sessions.pop(request.get('session'), None) is not None}
+        if op == 'stats':
+            return {'sessions': len(self.sessions), 'pending': self.pending, 'served': self.served,
+                    'rejected': self.rejected, 'timeouts': self.timeouts}
+        raise ServiceError(f"unknown op {op!r}")
+
+    async def respond(self, line, writer, slots):
+        """
+        Description:
+            - Answers one request line and releases its slot of the connection
+
+        Parameters:
+            - line (bytes) : The request
+            - writer (asyncio.StreamWriter) : The connection to reply on
+            - slots (asyncio.Semaphore) : The connection's in-flight request slots
+
+        Returns:
+            - None
+        """
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict): raise ServiceError('request must be a JSON object')
+            response = await self.handle(request)
+            self.served += 1
+        except (ServiceError, ValueError, TypeError, KeyError) as error:
+            response = {'error': str(error)}
+        except Exception:
+            response = {'error': 'internal error'}
+        finally: slots.release()
+        if isinstance(request, dict) and 'id' in request: response['id'] = request['id']
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    async def connection(self, reader, writer):
+        # Each connection may have a few requests in flight. Beyond that it is no longer read
+        # from, which pushes back on the client through TCP flow control.
+        slots = asyncio.Semaphore(self.args.max_inflight)
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                if not line.strip(): continue
+                await slots.acquire()
+                task = asyncio.create_task(self.respond(line, writer, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks: await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError: pass
+        finally: writer.close()
+
+    async def expire_sessions(self):
+        # Drop the sessions that have been idle for longer than -session-ttl
+        while True:
+            await asyncio.sleep(max(1.0, self.args.session_ttl / 10))
+            cutoff = time.monotonic() - self.args.session_ttl
+            while self.sessions and next(iter(self.sessions.values())).last_used < cutoff:
+                self.sessions.popitem(last=False)
+
+    async def serve(self):
+        server = await asyncio.start_server(self.connection, self.args.host, self.args.port, limit=2**16)
+        print(f"Serving moves on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+        expiry = asyncio.create_task(self.expire_sessions())
+        async with server:
+            try: await server.serve_forever()
+            finally: expiry.cancel()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve AI moves over TCP, one JSON request and response per line')
+    parser.add_argument('-host', default='127.0.0.1', type=str, help='Address to listen on')
+    parser.add_argument('-port', default=8765, type=int, help='Port to listen on')
+    parser.add_argument('-processes', default=4, type=int, help='Worker processes that run the searches')
+    parser.add_argument('-deadline', default=5.0, type=float, help='Longest a search may take in seconds. Requests may ask for less.')
+    parser.add_argument('-max-pending', default=256, type=int, help='Searches queued for the workers before new ones are rejected as busy')
+    parser.add_argument('-max-inflight', default=8, type=int, help='Requests in flight per connection before it stops being read')
+    parser.add_argument('-max-sessions', default=100000, type=int, help='Sessions kept in memory. The least recently used are dropped first.')
+    parser.add_argument('-session-ttl', default=3600.0, type=float, help='Seconds an idle session is kept')
+    parser.add_argument('-seed', default=0, type=int, help='Seed for Randomization. Enter an Integer Value.')
+    add_agent_arguments(parser)
+    args = parser.parse_args()
+    if args.book is not None: parser.error('-book is not supported by the server')
+    args.workers = 1
+    args.ponder = False  # Searches must not outlive their request or game
+    transposition.shared_table.max_entries = args.tt_size
+    try: asyncio.run(MoveServer(args).serve())
+    except KeyboardInterrupt: pass
@@ -0,0 +1,609 @@
+import argparse
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+import zlib
+import random
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from bitboard import Bitboard
+from rules import win_masks, lines_through, check_winner
+from transposition import EXACT, LOWER, UPPER
+
+# File layout: a fixed header, then (for the sorted layout) the sorted position ranks as
+# little-endian uint64, then one (value int8, move uint8) record per position.
+MAGIC = b'TTTB'
+VERSION = 1
+HEADER = struct.Struct('<4sHBBBBHIQ')  # magic, version, rows, cols, k, layout, padding, rules checksum, count
+DENSE, SORTED = 0, 1
+RECORD = np.dtype([('value', 'i1'), ('move', 'u1')])
+UNKNOWN = -128  # Value of positions missing from a dense table
+NO_MOVE = 255  # Move of terminal positions
+MAX_DENSE_CELLS = 15  # Largest board stored as a directly indexed array of 3**cells records
+MAX_CELLS = 40  # Largest board whose rank fits in a uint64
+
+# Search cache layout: the same header with CACHE_MAGIC and the slot count, then one uint64
+# per slot packing (tag 40 bits | empty cells 6 | flag + 1 2 | value 8 | move 8). Slots come
+# in pairs: the first keeps the entry with the most empty cells, the second the most recent.
+CACHE_MAGIC = b'TTTC'
+MAX_CACHE_CELLS = 32  # Largest board whose (x, o) key fits in 64 bits
+TAG_BITS = 40
+
+
+def rules_checksum(rows, cols, k):
+    """
+    Description:
+        - Fingerprints the engine's winning lines so a table solved under different rules is rejected
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A 32-bit checksum
+    """
+    masks = win_masks(rows, cols, k)
+    return zlib.crc32(b','.join(str(mask).encode() for mask in sorted(masks)))
+
+
+def rank(x, o, cells):
+    """
+    Description:
+        - Maps a position to its base-3 number, with cell i contributing 3**i times 0 (empty), 1 (X) or 2 (O)
+
+    Parameters:
+        - x (int) : Bit mask of the cells held by X
+        - o (int) : Bit mask of the cells held by O
+        - cells (int) : Number of cells on the board
+
+    Returns:
+        - The rank of the position
+    """
+    result, power = 0, 1
+    for cell in range(cells):
+        if x >> cell & 1: result += power
+        elif o >> cell & 1: result += 2 * power
+        power *= 3
+    return result
+
+
+def unrank(value, cells):
+    """
+    Description:
+        - Inverse of rank()
+
+    Parameters:
+        - value (int) : The rank of the position
+        - cells (int) : Number of cells on the board
+
+    Returns:
+        - (x, o) bit masks of the position
+    """
+    x = o = 0
+    for cell in range(cells):
+        value, digit = divmod(value, 3)
+        if digit == 1: x |= 1 << cell
+        elif digit == 2: o |= 1 << cell
+    return x, o
+
+
+def solve(rows, cols, k):
+    """
+    Description:
+        - Solves every reachable position up to symmetry with a memoized negamax. Values are
+          from the point of view of the player to move: 0 for a draw, and for a decided game
+          (empty cells left at the end + 1), positive if the player to move wins, so faster
+          wins and slower losses score better.
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - A dict mapping canonical (x, o) to (value, move), move being in canonical coordinates
+    """
+    table = {}
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * rows * cols + 100))
+
+    def negamax(state, last=None):
+        x, o, perm, _ = state.canonical()
+        if (x, o) in table: return table[(x, o)][0]
+        result = check_winner(state, last)
+        if result == 'Tie': value, move = 0, NO_MOVE
+        elif result is not None: value, move = -(bin(state.empty()).count('1') + 1), NO_MOVE
+        else:
+            value, move = -rows * cols - 2, None
+            for cell in state.legal_moves():
+                state.make(cell)
+                child = -negamax(state, cell)
+                state.unmake(cell)
+                if child > value: value, move = child, cell
+            move = perm[move]
+        table[(x, o)] = (value, move)
+        return value
+
+    negamax(Bitboard(rows, cols, k))
+    return table
+
+
+def write_book(path, rows, cols, k, table):
+    """
+    Description:
+        - Writes a solved table to disk
+
+    Parameters:
+        - path (str) : The file to write
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+        - table (dict) : The output of solve()
+
+    Returns:
+        - None
+    """
+    cells = rows * cols
+    if cells > MAX_CELLS: raise ValueError(f"boards larger than {MAX_CELLS} cells are not supported")
+    ranks = np.array([rank(x, o, cells) for x, o in table], dtype='<u8')
+    records = np.array(list(table.values()), dtype=RECORD)
+    layout = DENSE if cells <= MAX_DENSE_CELLS else SORTED
+    with open(path, 'wb') as f:
+        if layout == DENSE:
+            dense = np.zeros(3 ** cells, dtype=RECORD)
+            dense['value'] = UNKNOWN
+            dense['move'] = NO_MOVE
+            dense[ranks] = records
+            f.write(HEADER.pack(MAGIC, VERSION, rows, cols, k, layout, 0, rules_checksum(rows, cols, k), len(dense)))
+            f.write(dense.tobytes())
+        else:
+            order = np.argsort(ranks)
+            f.write(HEADER.pack(MAGIC, VERSION, rows, cols, k, layout, 0, rules_checksum(rows, cols, k), len(ranks)))
+            f.write(ranks[order].tobytes())
+            f.write(records[order].tobytes())
+
+
+class OpeningBook:
+    def __init__(self, path, rows=3, cols=3, k=3, validate=256):
+        """
+        Description:
+            - Memory-maps a table written by this module. Only the pages that are looked up
+              are read from disk, and a lookup is a canonicalization plus an array index
+              (a binary search for boards stored in the sorted layout).
+
+        Parameters:
+            - path (str) : The table file
+            - rows (int) : Number of rows the table must have been solved for
+            - cols (int) : Number of columns the table must have been solved for
+            - k (int) : Number of cells in a row the table must have been solved for
+            - validate (int) : Number of random entries to check against the engine's rules on load
+        """
+        self.path = path
+        raw = np.memmap(path, dtype=np.uint8, mode='r')
+        if len(raw) < HEADER.size: raise ValueError(f"{path} is not an opening book")
+        magic, version, f_rows, f_cols, f_k, layout, _, checksum, count = HEADER.unpack(raw[:HEADER.size].tobytes())
+        if magic != MAGIC: raise ValueError(f"{path} is not an opening book")
+        if version != VERSION: raise ValueError(f"{path} has version {version}, expected {VERSION}")
+        if (f_rows, f_cols, f_k) != (rows, cols, k):
+            raise ValueError(f"{path} was solved for a {f_rows}x{f_cols} board with {f_k} in a row, not {rows}x{cols} with {k}")
+        if checksum != rules_checksum(rows, cols, k): raise ValueError(f"{path} was solved under different rules")
+        expected = HEADER.size + count * RECORD.itemsize + (count * 8 if layout == SORTED else 0)
+        if len(raw) != expected: raise ValueError(f"{path} is truncated or corrupt")
+        self.rows, self.cols, self.k = rows, cols, k
+        self.cells = rows * cols
+        self.layout = layout
+        offset = HEADER.size
+        if layout == SORTED:
+            self.keys = raw[offset:offset + count * 8].view('<u8')
+            offset += count * 8
+        self.records = raw[offset:].view(RECORD)
+        if validate: self.validate(validate)
+
+    def lookup(self, state):
+        """
+        Description:
+            - Looks up a position
+
+        Parameters:
+            - state (Bitboard) : The position to look up
+
+        Returns:
+            - (value, move) if the position is in the table, None otherwise. value is from the
+              point of view of the player to move and move is a cell in the coordinates of
+              state, or None if the game is over.
+        """
+        x, o, _, inverse = state.canonical()
+        index = rank(x, o, self.cells)
+        if self.layout == SORTED:
+            i = int(np.searchsorted(self.keys, index))
+            if i == len(self.keys) or self.keys[i] != index: return None
+            index = i
+        value, move = self.records[index]
+        if value == UNKNOWN: return None
+        return int(value), None if move == NO_MOVE else inverse[move]
+
+    def best_move(self, state):
+        """
+        Description:
+            - Returns the perfect-play move of a position
+
+        Parameters:
+            - state (Bitboard) : The position to play from
+
+        Returns:
+            - A cell in the coordinates of state, or None if the position is not in the table
+        """
+        entry = self.lookup(state)
+        return None if entry is None else entry[1]
+
+    def validate(self, samples=None):
+        """
+        Description:
+            - Checks stored entries against the engine's rules: terminal positions must have no
+              move, other positions must have a legal best move, and the value must agree with
+              the value stored for the position that move leads to
+
+        Parameters:
+            - samples (int) : Number of random entries to check, or None to check all of them
+
+        Returns:
+            - None. Raises ValueError on the first inconsistent entry
+        """
+        if self.layout == SORTED: indexes = np.arange(len(self.keys))
+        else: indexes = np.flatnonzero(self.records['value'] != UNKNOWN)
+        if samples is not None and samples < len(indexes):
+            indexes = random.Random(0).sample(list(indexes), samples)
+        for index in indexes:
+            position = int(self.keys[index]) if self.layout == SORTED else int(index)
+            x, o = unrank(position, self.cells)
+            state = Bitboard(self.rows, self.cols, self.k, x, o, 1 if bin(x).count('1') > bin(o).count('1') else 0)
+            value, move = self.lookup(state)
+            result = check_winner(state)
+            if result is not None:
+                if move is not None: raise ValueError(f"{self.path}: finished position {state} has a move")
+                if value != (0 if result == 'Tie' else -(bin(state.empty()).count('1') + 1)):
+                    raise ValueError(f"{self.path}: finished position {state} has the wrong value")
+                continue
+            if move is None or not state.is_empty(move): raise ValueError(f"{self.path}: position {state} has an illegal move")
+            state.make(move)
+            child = self.lookup(state)
+            if child is None or child[0] != -value: raise ValueError(f"{self.path}: position {state} disagrees with its best move")
+
+
+def mix(key, bits):
+    """
+    Description:
+        - Scrambles a key of the given width with an invertible hash, so distinct keys
+          keep distinct hashes while their low bits spread evenly over the table
+
+    Parameters:
+        - key (int) : The key, below 2**bits
+        - bits (int) : Width of the key
+
+    Returns:
+        - The hash, below 2**bits
+    """
+    mask, shift = (1 << bits) - 1, max(1, bits // 2)
+    key = key * 0x9E3779B97F4A7C15 & mask
+    key ^= key >> shift
+    key = key * 0xBF58476D1CE4E5B9 & mask
+    return key ^ key >> shift
+
+
+class SearchCache:
+    def __init__(self, path, rows, cols, k, slots=2**22):
+        """
+        Description:
+            - Disk-backed transposition table of the parallel solver. The file is memory-mapped
+              by every solving process, so results found by one process are seen by the
+              others, and it survives the solve so an interrupted run resumes where it
+              stopped. Values are exact game values or bounds on them, as in solve(), so
+              any entry stays valid however it was found.
+
+        Parameters:
+            - path (str) : The cache file. Created if missing, reused if it matches the board
+            - rows (int) : Number of rows on the board
+            - cols (int) : Number of columns on the board
+            - k (int) : Number of cells in a row needed to win
+            - slots (int) : Number of slots of a new cache, rounded up to a power of 2
+        """
+        cells = rows * cols
+        if cells > MAX_CACHE_CELLS: raise ValueError(f"boards larger than {MAX_CACHE_CELLS} cells are not supported")
+        self.path, self.rows, self.cols, self.k, self.cells = path, rows, cols, k, cells
+        self.key_bits = 2 * cells
+        if os.path.exists(path):
+            with open(path, 'rb') as f: header = f.read(HEADER.size)
+            magic, version, f_rows, f_cols, f_k, _, _, checksum, slots = HEADER.unpack(header) if len(header) == HEADER.size else (None,) * 9
+            if magic != CACHE_MAGIC or version != VERSION: raise ValueError(f"{path} is not a search cache")
+            if (f_rows, f_cols, f_k) != (rows, cols, k) or checksum != rules_checksum(rows, cols, k):
+                raise ValueError(f"{path} caches a {f_rows}x{f_cols} board with {f_k} in a row, not {rows}x{cols} with {k}")
+            if os.path.getsize(path) != HEADER.size + 8 * slots: raise ValueError(f"{path} is truncated or corrupt")
+        else:
+            # Enough buckets that the hash bits above the bucket index fit in the tag
+            slots = 1 << (max(slots, 1 << max(1, self.key_bits - TAG_BITS + 1)) - 1).bit_length()
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(CACHE_MAGIC, VERSION, rows, cols, k, 0, 0, rules_checksum(rows, cols, k), slots))
+                f.truncate(HEADER.size + 8 * slots)
+        self.slots = np.memmap(path, dtype='<u8', mode='r+', offset=HEADER.size, shape=(slots,))
+        self.bucket_bits = (slots // 2).bit_length() - 1
+        self.bucket_mask = (1 << self.bucket_bits) - 1
+
+    def locate(self, x, o):
+        h = mix(x | o << self.cells, self.key_bits)
+        return 2 * (h & self.bucket_mask), h >> self.bucket_bits
+
+    def probe(self, x, o):
+        """
+        Description:
+            - Looks up a canonical position
+
+        Parameters:
+            - x (int) : Canonical bit mask of X
+            - o (int) : Canonical bit mask of O
+
+        Returns:
+            - (value, flag, move) with move in canonical coordinates (NO_MOVE if none), or None
+        """
+        index, tag = self.locate(x, o)
+        for slot in (index, index + 1):
+            word = int(self.slots[slot])
+            if word and word >> 24 == tag:
+                value = word >> 8 & 0xFF
+                return value - 256 if value > 127 else value, (word >> 16 & 3) - 1, word & 0xFF
+        return None
+
+    def store(self, x, o, empties, value, flag, move):
+        """
+        Description:
+            - Stores a result, keeping the entry with the most empty cells (the most work to
+              redo) in the first slot of the bucket and the newest entry in the second
+
+        Parameters:
+            - x (int) : Canonical bit mask of X
+            - o (int) : Canonical bit mask of O
+            - empties (int) : Number of empty cells of the position
+            - value (int) : Value, or bound on it, from the point of view of the player to move
+            - flag (int) : EXACT, LOWER or UPPER
+            - move (int) : Best or refuting cell in canonical coordinates, NO_MOVE if none
+
+        Returns:
+            - None
+        """
+        index, tag = self.locate(x, o)
+        word = tag << 24 | empties << 18 | (flag + 1) << 16 | (value & 0xFF) << 8 | move
+        first, second = int(self.slots[index]), int(self.slots[index + 1])
+        if second and second >> 24 == tag: self.slots[index + 1] = word
+        elif not first or first >> 24 == tag or empties >= (first >> 18 & 63):
+            if first and first >> 24 != tag: self.slots[index + 1] = first
+            self.slots[index] = word
+        else: self.slots[index + 1] = word
+
+    def fill(self):
+        """Returns the fraction of slots in use"""
+        return np.count_nonzero(self.slots) / len(self.slots)
+
+    def flush(self):
+        self.slots.flush()
+
+    def best_move(self, state):
+        """
+        Description:
+            - Returns a move the cache proves best (an exact entry) or winning (a lower bound
+              above 0), so a solved cache can be played from like an OpeningBook
+
+        Parameters:
+            - state (Bitboard) : The position to play from
+
+        Returns:
+            - A cell in the coordinates of state, or None
+        """
+        x, o, _, inverse = state.canonical()
+        entry = self.probe(x, o)
+        if entry is None: return None
+        value, flag, move = entry
+        if move == NO_MOVE or not (flag == EXACT or flag == LOWER and value > 0): return None
+        return inverse[move]
+
+
+class CacheSolver:
+    def __init__(self, cache, counter=None):
+        """
+        Description:
+            - Alpha-beta negamax over canonical positions backed by a SearchCache. Values
+              follow solve(): 0 for a draw, otherwise (empty cells at the end + 1) for the
+              winner, signed from the point of view of the player to move.
+
+        Parameters:
+            - cache (SearchCache) : The shared cache
+            - counter (multiprocessing.Value) : Shared count of visited positions for progress reports
+        """
+        self.cache = cache
+        self.counter = counter
+        self.nodes = self.reported = 0
+        through = lines_through(cache.rows, cache.cols, cache.k)
+        self.order = sorted(range(cache.cells), key=lambda cell: -len(through[cell]))
+
+    def value(self, state, alpha, beta, last=None):
+        """
+        Description:
+            - Searches a position
+
+        Parameters:
+            - state (Bitboard) : The position, restored before returning
+            - alpha (int) : Lower end of the search window
+            - beta (int) : Upper end of the search window
+            - last (int) : The last move played, if known
+
+        Returns:
+            - The value if it lies inside the window, otherwise a bound on the side it fell
+        """
+        self.nodes += 1
+        if self.counter is not None and self.nodes - self.reported >= 4096:
+            with self.counter.get_lock(): self.counter.value += self.nodes - self.reported
+            self.reported = self.nodes
+        result = check_winner(state, last)
+        if result == 'Tie': return 0
+        if result is not None: return -(state.empty_count + 1)
+
+        # Nothing beats winning with the next move
+        empties = state.empty_count
+        beta = min(beta, empties)
+        if alpha >= beta: return beta
+
+        x, o, perm, inverse = state.canonical()
+        entry = self.cache.probe(x, o)
+        first = None
+        if entry is not None:
+            value, flag, move = entry
+            if flag == EXACT: return value
+            if flag == LOWER: alpha = max(alpha, value)
+            elif flag == UPPER: beta = min(beta, value)
+            if alpha >= beta: return value
+            if move != NO_MOVE: first = inverse[move]
+
+        alpha_orig, best, best_cell = alpha, -self.cache.cells - 2, None
+        moves = [cell for cell in self.order if state.is_empty(cell)]
+        if first is not None: moves.insert(0, moves.pop(moves.index(first)))
+        for cell in moves:
+            state.make(cell)
+            value = -self.value(state, -beta, -alpha, cell)
+            state.unmake(cell)
+            if value > best: best, best_cell = value, cell
+            alpha = max(alpha, value)
+            if alpha >= beta: break
+        flag = LOWER if best >= beta else UPPER if best <= alpha_orig else EXACT
+        self.cache.store(x, o, empties, best, flag, perm[best_cell])
+        return best
+
+
+_worker = {}
+
+def _init_worker(path, rows, cols, k, counter):
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * rows * cols + 100))
+    _worker['solver'] = CacheSolver(SearchCache(path, rows, cols, k), counter)
+
+
+def _solve_root_move(cell):
+    solver = _worker['solver']
+    cache = solver.cache
+    state = Bitboard(cache.rows, cache.cols, cache.k)
+    state.make(cell)
+    value = -solver.value(state, -cache.cells - 2, cache.cells + 2, cell)
+    with solver.counter.get_lock(): solver.counter.value += solver.nodes - solver.reported
+    solver.reported = solver.nodes
+    cache.flush()
+    return cell, value
+
+
+def solve_parallel(rows, cols, k, path, slots=2**22, processes=None, progress=10.0, log=print):
+    """
+    Description:
+        - Solves the starting position of a board too large for solve(), giving each
+          distinct first move (up to symmetry) to a worker process. The workers share a
+          memory-mapped SearchCache at path, and the values of finished first moves are
+          kept next to it in path + '.json', so an interrupted solve picks up where it
+          stopped when run again.
+
+    Parameters:
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+        - path (str) : The cache file
+        - slots (int) : Number of slots of a new cache
+        - processes (int) : Number of worker processes. Defaults to the number of CPUs
+        - progress (float) : Seconds between progress reports
+        - log : Function the progress reports are passed to
+
+    Returns:
+        - (value, cell) of the starting position, as in solve()
+    """
+    cache = SearchCache(path, rows, cols, k, slots)
+    checkpoint = path + '.json'
+    done = {}
+    if os.path.exists(checkpoint):
+        with open(checkpoint) as f: done = {int(cell): value for cell, value in json.load(f).items()}
+        log(f"Resuming with {len(done)} first moves already solved")
+
+    # Symmetric first moves have the same value, so only one of each is searched
+    root, roots = Bitboard(rows, cols, k), {}
+    for cell in root.legal_moves():
+        root.make(cell)
+        roots.setdefault(root.canonical()[:2], cell)
+        root.unmake(cell)
+    todo = [cell for cell in roots.values() if cell not in done]
+
+    counter = multiprocessing.Value('Q', 0)
+    start, last_nodes, last_time = time.perf_counter(), 0, time.perf_counter()
+    if todo:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(path, rows, cols, k, counter)) as pool:
+            pending = {pool.submit(_solve_root_move, cell) for cell in todo}
+            while pending:
+                finished, pending = wait(pending, timeout=progress, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    cell, value = future.result()
+                    done[cell] = value
+                    with open(checkpoint + '.tmp', 'w') as f: json.dump(done, f)
+                    os.replace(checkpoint + '.tmp', checkpoint)
+                now, nodes = time.perf_counter(), counter.value
+                if now - last_time >= progress or not pending:
+                    log(f"{len(done)}/{len(roots)} first moves solved, {nodes:,} positions, "
+                        f"{(nodes - last_nodes) / (now - last_time):,.0f} positions/s, cache {cache.fill():.1%} full, {now - start:.0f}s")
+                    last_nodes, last_time = nodes, now
+    value, cell = max((value, cell) for cell, value in done.items() if cell in roots.values())
+    x, o, perm, _ = root.canonical()
+    cache.store(x, o, root.empty_count, value, EXACT, perm[cell])
+    cache.flush()
+    return value, cell
+
+
+def open_book(path, rows=3, cols=3, k=3):
+    """
+    Description:
+        - Opens a perfect-play table written by write_book or a cache left by solve_parallel
+
+    Parameters:
+        - path (str) : The file
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - An OpeningBook or a SearchCache, both answering best_move(state)
+    """
+    with open(path, 'rb') as f: magic = f.read(len(CACHE_MAGIC))
+    if magic == CACHE_MAGIC: return SearchCache(path, rows, cols, k)
+    return OpeningBook(path, rows, cols, k)
+
+
+def describe(value, cells):
+    if value == 0: return 'a draw'
+    plies = cells - abs(value) + 1
+    return f"a win for the first player in {plies} moves" if value > 0 else f"a win for the second player in {plies} moves"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve Tic Tac Toe and write a perfect-play table for the AI agents')
+    parser.add_argument('-w', default=3, type=int, help='Rows of game')
+    parser.add_argument('-l', default=3, type=int, help='Columns of game')
+    parser.add_argument('-k', default=None, type=int, help='Number in a row needed to win. Defaults to min(3, rows, columns).')
+    parser.add_argument('-o', default='book.bin', type=str, help='File to write the table to')
+    parser.add_argument('-cache', default=None, type=str, help='Solve only the starting position with an alpha-beta search across processes, sharing this memory-mapped cache file. Rerun with the same file to resume. Agents can play from the file with -book.')
+    parser.add_argument('-cache-size', default=32, type=int, help='Megabytes of a new -cache file')
+    parser.add_argument('-processes', default=None, type=int, help='Worker processes used with -cache. Defaults to the number of CPUs.')
+    parser.add_argument('-progress', default=10.0, type=float, help='Seconds between progress reports with -cache')
+    args = parser.parse_args()
+
+    k = args.k if args.k is not None else min(3, args.w, args.l)
+    start = time.perf_counter()
+    if args.cache is not None:
+        value, cell = solve_parallel(args.w, args.l, k, args.cache, args.cache_size * 2**20 // 8, args.processes, args.progress)
+        print(f"{args.w}x{args.l} with {k} in a row is {describe(value, args.w * args.l)}, best first move {divmod(cell, args.l)} ({time.perf_counter() - start:.1f}s)")
+        sys.exit()
+    table = solve(args.w, args.l, k)
+    print(f"Solved {len(table)} positions in {time.perf_counter() - start:.2f}s")
+    write_book(args.o, args.w, args.l, k, table)
+    OpeningBook(args.o, args.w, args.l, k, validate=None)
+    print(f"Wrote and verified {args.o}")
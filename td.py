@@ -0,0 +1,162 @@
+import argparse
+import random
+import time
+import numpy as np
+from agents import check_agent
+from batch import BatchGame
+from players import TDAI, RandomAI, SimpleAI
+
+
+_tables = {}
+
+def load_values(path):
+    """
+    Description:
+        - Loads a value table saved by save_values once per process
+
+    Parameters:
+        - path (str) : The .npz file
+
+    Returns:
+        - (values, shape): a float32 numpy array indexed by indexing.PositionIndex.index and
+          the (rows, cols, k) it was trained for
+    """
+    if path not in _tables:
+        data = np.load(path)
+        if not hasattr(data, 'files') or not {'values', 'rows', 'cols', 'k'} <= set(data.files):
+            raise ValueError(f"{path} is not a value table written by td.py")
+        with data: _tables[path] = data['values'].astype(np.float32, copy=False), (int(data['rows']), int(data['cols']), int(data['k']))
+    return _tables[path]
+
+
+def save_values(path, values, rows, cols, k):
+    """
+    Description:
+        - Saves a value table together with the board it was trained for
+
+    Parameters:
+        - path (str) : The .npz file
+        - values (np.ndarray) : The table
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+
+    Returns:
+        - None
+    """
+    np.savez(path, values=values, rows=rows, cols=cols, k=k)
+
+
+def train(agent, rows, cols, k, games, batch_size=1024, alpha=0.2, log=None):
+    """
+    Description:
+        - Trains a TDAI by self-play with TD(0). Batches of games are played in lockstep by the
+          agent against itself. After every move, the value of the position the previous move
+          led to is pulled towards one minus the value of the position the reply leads to (the
+          game is zero-sum for scores in [0, 1]). Positions that end the game get their result.
+
+    Parameters:
+        - agent (TDAI) : The agent to train, playing both sides with its own explore rate
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+        - games (int) : Number of games to play
+        - batch_size (int) : Games played in lockstep
+        - alpha (float) : Learning rate
+        - log : Callable given a progress line every 10% of the games, or None
+
+    Returns:
+        - The value table
+    """
+    index, values = agent.table(rows, cols, k)
+    env = BatchGame(min(batch_size, games), (rows, cols), k)
+    previous = np.full(env.n, -1, dtype=np.int64)  # Class of each game's last position, -1 at the start
+    started, finished, reported = env.n, 0, 0
+    while finished < games:
+        active = np.flatnonzero(~env.done)
+        scores, classes, results = agent.afterstates(env, active)
+        moves = agent.choose(scores)
+        chosen = np.arange(len(active))
+        reached, result = classes[chosen, moves], results[chosen, moves]
+        cells = np.full(env.n, -1, dtype=np.intp)
+        cells[active] = moves
+        env.step(cells)
+
+        # The reply's position decides the value of the previous one, and final positions take their result
+        values[reached[result > 0]] = result[result > 0]
+        target = 1.0 - np.where(result > 0, result, values[reached])
+        learned = previous[active] >= 0
+        updated = previous[active][learned]
+        values[updated] += alpha * (target[learned] - values[updated])
+        previous[active] = reached
+
+        # Start new games in the place of the finished ones until enough have been started
+        ended = np.flatnonzero(env.done & (previous >= 0))
+        finished += len(ended)
+        restart = ended[:max(0, games - started)]
+        previous[ended] = -1
+        env.reset(restart)
+        started += len(restart)
+        if log is not None and finished * 10 // games > reported:
+            reported = finished * 10 // games
+            log(f"{finished} games")
+    return values
+
+
+def evaluate(agent, opponent, rows, cols, k, games):
+    """
+    Description:
+        - Plays an agent against an opponent, half the games as X and half as O
+
+    Parameters:
+        - agent : The agent to evaluate
+        - opponent : Its opponent
+        - rows (int) : Number of rows on the board
+        - cols (int) : Number of columns on the board
+        - k (int) : Number of cells in a row needed to win
+        - games (int) : Number of games
+
+    Returns:
+        - (wins, draws, losses) of the agent
+    """
+    wins = draws = losses = 0
+    for symbol, (player1, player2) in (('X', (agent, opponent)), ('O', (opponent, agent))):
+        env = BatchGame(games // 2, (rows, cols), k)
+        env.play(player1, player2)
+        results = env.results()
+        wins += results.count(symbol)
+        draws += results.count('Tie')
+        losses += len(results) - results.count(symbol) - results.count('Tie')
+    return wins, draws, losses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the value table of tdAI by self-play')
+    parser.add_argument('-w', default=3, type=int, help='Rows of game')
+    parser.add_argument('-l', default=3, type=int, help='Columns of game')
+    parser.add_argument('-k', default=None, type=int, help='Number in a row needed to win. Defaults to 3 (or the shorter side of smaller boards).')
+    parser.add_argument('-games', default=200000, type=int, help='Self-play games to train on')
+    parser.add_argument('-batch', default=1024, type=int, help='Games played in lockstep')
+    parser.add_argument('-alpha', default=0.2, type=float, help='Learning rate')
+    parser.add_argument('-explore', default=0.1, type=float, help='Probability of a random move during training')
+    parser.add_argument('-init', default=None, type=str, help='Value table to continue training from')
+    parser.add_argument('-seed', default=0, type=int, help='Seed for Randomization. Enter an Integer Value.')
+    parser.add_argument('-o', default='td.npz', type=str, help='File to write the value table to')
+    args = parser.parse_args()
+    k = min(3, args.w, args.l) if args.k is None else args.k
+    random.seed(args.seed)
+    try: check_agent('tdAI', argparse.Namespace(td=args.init), args.w, args.l, k)
+    except ValueError as error: parser.error(str(error))
+
+    values, shape = (None, None) if args.init is None else load_values(args.init)
+    agent = TDAI('X', None if values is None else values.copy(), explore=args.explore, shape=shape)
+    start = time.perf_counter()
+    values = train(agent, args.w, args.l, k, args.games, args.batch, args.alpha, log=lambda line: print(line, flush=True))
+    print(f"Trained on {args.games} games in {time.perf_counter() - start:.1f}s")
+    save_values(args.o, values, args.w, args.l, k)
+    print(f"Wrote {args.o} ({len(values)} positions)")
+
+    agent.explore = 0.0
+    for name, opponent in (('randomAI', RandomAI('O')), ('simpleAI', SimpleAI('O'))):
+        wins, draws, losses = evaluate(agent, opponent, args.w, args.l, k, 2000)
+        print(f"Against {name}: {wins} wins, {draws} draws, {losses} losses")
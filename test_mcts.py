@@ -0,0 +1,19 @@
+import time
+import unittest
+from bitboard import Bitboard
+from mcts import MCTS
+
+
+class SearchBudgetTest(unittest.TestCase):
+    def test_large_board_search_keeps_to_its_time_limit(self):
+        # Includes building the board's line tables, which the first search on a shape pays for
+        for rows, cols, k in ((15, 15, 5), (32, 32, 5)):
+            tree = MCTS(max_nodes=100000)
+            start = time.perf_counter()
+            tree.search(Bitboard(rows, cols, k), time_limit=0.1)
+            self.assertLess(time.perf_counter() - start, 0.3, f"{rows}x{cols} search overran its budget")
+            self.assertGreater(tree.iterations, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import time
+from rules import line_indexes, win_masks
+
+# Threat-space search for k-in-a-row. A "four" is a line holding k - 1 of a player's pieces
+# and none of the opponent's, so its last cell wins; a "three" is a line holding k - 2, which
+# a single move turns into a four. The search only tries forcing moves: moves that make a four
+# (the opponent must take its last cell) and, optionally, moves after which the player could
+# make two fours at once (the opponent must break that up). Against such moves the defender
+# has few sensible replies, so wins many moves deep are found by a narrow search.
+
+
+class ThreatBoard:
+    def __init__(self, state):
+        """
+        Description:
+            - A position together with the pieces of each player in every winning line, kept
+              up to date as moves are made and unmade
+
+        Parameters:
+            - state (Bitboard) : The position, copied
+        """
+        self.state = state.copy()
+        self.k = state.k
+        self.lines = win_masks(state.rows, state.cols, state.k)
+        self.through = line_indexes(state.rows, state.cols, state.k)
+        self.counts = ([0] * len(self.lines), [0] * len(self.lines))
+
+        # open_lines[player][n] holds the lines with n of player's pieces and none of the opponent's
+        self.open_lines = tuple([set() for _ in range(self.k)] for _ in range(2))
+        for line, mask in enumerate(self.lines):
+            x, o = bin(mask & state.x).count('1'), bin(mask & state.o).count('1')
+            self.counts[0][line], self.counts[1][line] = x, o
+            if x and not o and x < self.k: self.open_lines[0][x].add(line)
+            if o and not x and o < self.k: self.open_lines[1][o].add(line)
+
+    def make(self, cell):
+        player = self.state.turn
+        mine, theirs = self.counts[player], self.counts[1 - player]
+        for line in self.through[cell]:
+            count = mine[line]
+            if not theirs[line]:
+                if count: self.open_lines[player][count].discard(line)
+                if count + 1 < self.k: self.open_lines[player][count + 1].add(line)
+            elif not count: self.open_lines[1 - player][theirs[line]].discard(line)
+            mine[line] = count + 1
+        self.state.make(cell)
+
+    def unmake(self, cell):
+        self.state.unmake(cell)
+        player = self.state.turn
+        mine, theirs = self.counts[player], self.counts[1 - player]
+        for line in self.through[cell]:
+            count = mine[line] - 1
+            if not theirs[line]:
+                if count + 1 < self.k: self.open_lines[player][count + 1].discard(line)
+                if count: self.open_lines[player][count].add(line)
+            elif not count: self.open_lines[1 - player][theirs[line]].add(line)
+            mine[line] = count
+
+    def empty_cells(self, line):
+        mask = self.lines[line] & ~(self.state.x | self.state.o)
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def winning_cells(self, player):
+        # The last cells of player's fours
+        return {cell for line in self.open_lines[player][self.k - 1] for cell in self.empty_cells(line)}
+
+    def fours_made(self, player):
+        # For each cell that gives player a four, the last cells of the fours it makes
+        made = {}
+        for line in self.open_lines[player][self.k - 2] if self.k >= 3 else ():
+            cells = list(self.empty_cells(line))
+            for cell in cells: made.setdefault(cell, set()).update(other for other in cells if other != cell)
+        return made
+
+    def four_moves(self, player):
+        # Cells that give player a four, those that give it two fours (and so a win) first
+        made = self.fours_made(player)
+        return sorted(made, key=lambda cell: -len(made[cell]))
+
+    def double_four_defences(self, player):
+        # The cells the opponent may take to stop player making two fours at once: the cells
+        # that would make them and the last cells of those fours. Empty if player has none.
+        defences = set()
+        for cell, winners in self.fours_made(player).items():
+            if len(winners) >= 2: defences |= winners | {cell}
+        return defences
+
+    def three_moves(self, player):
+        # Cells that add to lines holding k - 3 of player's pieces, those on the most such lines first
+        counts = {}
+        for line in self.open_lines[player][self.k - 3] if self.k >= 4 else ():
+            for cell in self.empty_cells(line): counts[cell] = counts.get(cell, 0) + 1
+        return sorted(counts, key=lambda cell: -counts[cell])
+
+
+class ThreatSearch:
+    def __init__(self, board, max_nodes=20000, time_limit=None):
+        """
+        Description:
+            - Searches a ThreatBoard for a forced win of the player to move
+
+        Parameters:
+            - board (ThreatBoard) : The position
+            - max_nodes (int) : Most moves tried before the search gives up
+            - time_limit (float) : Seconds after which the search gives up, or None for no limit
+        """
+        self.board = board
+        self.max_nodes = max_nodes
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        self.nodes = 0
+        self.cache = {}
+
+    def find(self, four_depth=16, three_depth=4):
+        """
+        Description:
+            - Looks for a win by continuous fours first, then for one that may also use threes
+
+        Parameters:
+            - four_depth (int) : Most moves of the attacker in a sequence of fours
+            - three_depth (int) : Most moves of the attacker in a sequence with threes
+
+        Returns:
+            - (cell, moves) of the first move of a forced win and the attacker's moves it takes,
+              or None if none was found within the limits
+        """
+        if self.board.state.winner() is not None: return None
+        for threes, max_depth in ((False, four_depth), (True, three_depth)):
+            if threes and self.board.k < 4: break
+            for depth in range(1, max_depth + 1):
+                cell = self.attack(depth, threes)
+                if cell is not None: return cell, depth
+                if self.exhausted(): return None
+        return None
+
+    def attack(self, depth, threes):
+        # A forcing move of the player to move after which every defence loses, or None
+        board = self.board
+        attacker = board.state.turn
+        wins = board.winning_cells(attacker)
+        if wins: return min(wins)
+        blocks = board.winning_cells(1 - attacker)
+        if len(blocks) > 1 or depth == 0 or self.exhausted(): return None
+        # A win found with fewer moves still holds with more, and a failure with more moves holds with fewer
+        key = (board.state.x, board.state.o, threes)
+        if key in self.cache:
+            known_depth, known = self.cache[key]
+            if (known is not None and known_depth <= depth) or (known is None and known_depth >= depth): return known
+
+        # A four of the defender must be blocked, and the block must itself be a threat
+        if blocks: moves = list(blocks)
+        else:
+            moves = board.four_moves(attacker)
+            if threes:
+                fours = set(moves)
+                moves += [cell for cell in board.three_moves(attacker) if cell not in fours]
+        result = None
+        for cell in moves:
+            self.nodes += 1
+            board.make(cell)
+            won = self.defend(depth, threes)
+            board.unmake(cell)
+            if won:
+                result = cell
+                break
+        if result is not None or not self.exhausted(): self.cache[key] = (depth, result)
+        return result
+
+    def exhausted(self):
+        # Whether the node budget or the time limit has run out
+        return self.nodes >= self.max_nodes or (self.deadline is not None and time.perf_counter() > self.deadline)
+
+    def defend(self, depth, threes):
+        # Whether the attacker, who has just moved, wins against every reply
+        board = self.board
+        defender = board.state.turn
+        attacker = 1 - defender
+        if board.winning_cells(defender): return False
+        wins = board.winning_cells(attacker)
+        if len(wins) >= 2: return True
+        if wins: replies = wins
+        elif threes and (defences := board.double_four_defences(attacker)):
+
+            # Only moves on the threes that would make two fours can stop them, and the
+            # defender's own fours could make the attacker answer them first
+            replies = defences | set(board.four_moves(defender))
+        else: return False
+        for reply in replies:
+            self.nodes += 1
+            board.make(reply)
+            won = self.attack(depth - 1, threes) is not None
+            board.unmake(reply)
+            if not won: return False
+        return True
@@ -0,0 +1,207 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+import numpy as np
+import transposition
+from agents import agents, add_agent_arguments, check_agent, make_agent
+from board import TicTacToe
+from records import RecordWriter, check_shape
+
+ELO_SCALE = 400 / math.log(10)
+
+
+def game_seed(seed, game):
+    """
+    Description:
+        - Derives the seed of one game from the tournament seed, so any game can be replayed on its own
+
+    Parameters:
+        - seed (int) : The tournament seed, taken modulo 2**64 so negative seeds work too
+        - game (int) : The game number
+
+    Returns:
+        - A 64-bit seed
+    """
+    return int(np.random.SeedSequence([seed & 2**64 - 1, game]).generate_state(1, np.uint64)[0])
+
+
+def schedule(names, games, seed):
+    """
+    Description:
+        - Lists the games of a round robin. Every pair of agents plays games times, swapping
+          who plays X after each game.
+
+    Parameters:
+        - names (list) : The agents taking part
+        - games (int) : Number of games per pair
+        - seed (int) : The tournament seed
+
+    Returns:
+        - A list of (game number, X agent, O agent, game seed) tuples
+    """
+    tasks = []
+    for first, second in combinations(names, 2):
+        for i in range(games):
+            x, o = (first, second) if i % 2 == 0 else (second, first)
+            tasks.append((len(tasks), x, o, game_seed(seed, len(tasks))))
+    return tasks
+
+
+def play_game(task, args):
+    """
+    Description:
+        - Plays one headless game. The random generators and the shared transposition table
+          are reset first, so the result only depends on the game seed.
+
+    Parameters:
+        - task (tuple) : (game number, X agent, O agent, game seed)
+        - args (argparse.Namespace) : The parsed command line
+
+    Returns:
+        - A dict describing the game
+    """
+    game, x, o, seed = task
+    random.seed(seed)
+    transposition.shared_table.clear()
+    start = time.perf_counter()
+    player1, player2 = make_agent(x, 'X', args), make_agent(o, 'O', args)
+    winner = TicTacToe(player1, player2, board_shape=(args.w, args.l), k=args.k).play()
+    moves = [None] * (len(player1.history) + len(player2.history))
+    moves[0::2], moves[1::2] = player1.history, player2.history
+    return {'game': game, 'x': x, 'o': o, 'seed': seed, 'winner': 'tie' if winner == 'Tie' else winner.symbol,
+            'moves': moves, 'seconds': time.perf_counter() - start}
+
+
+def play_games(tasks, args):
+    """
+    Description:
+        - Plays a chunk of games in a worker process
+
+    Parameters:
+        - tasks (list) : The games to play, see schedule()
+        - args (argparse.Namespace) : The parsed command line
+
+    Returns:
+        - A list of game dicts
+    """
+    transposition.shared_table.max_entries = args.tt_size
+    return [play_game(task, args) for task in tasks]
+
+
+def elo_ratings(names, points, games, iterations=1000):
+    """
+    Description:
+        - Fits Bradley-Terry strengths to the results by minorization-maximization and converts
+          them to Elo ratings centred on 0. Each pair is given one virtual draw so that unbeaten
+          or winless agents still get a finite rating. Standard errors come from the inverse
+          of the Fisher information.
+
+    Parameters:
+        - names (list) : The agents
+        - points (np.ndarray) : points[i, j] is the score of agent i against agent j (1 per win, 0.5 per draw)
+        - games (np.ndarray) : games[i, j] is the number of games between agents i and j
+
+    Returns:
+        - (ratings, standard errors) as numpy arrays in Elo points
+    """
+    n = len(names)
+    prior = 1 - np.eye(n)
+    points, games = points + 0.5 * prior, games + prior
+    gamma = np.ones(n)
+    for _ in range(iterations):
+        updated = points.sum(axis=1) / (games / (gamma[:, None] + gamma[None, :])).sum(axis=1)
+        updated /= np.exp(np.log(updated).mean())
+        if np.allclose(updated, gamma, rtol=1e-10): break
+        gamma = updated
+    strength = np.log(gamma)
+    p = gamma[:, None] / (gamma[:, None] + gamma[None, :])
+    information = -games * p * p.T
+    np.fill_diagonal(information, 0)
+    np.fill_diagonal(information, -information.sum(axis=1))
+    errors = np.sqrt(np.clip(np.diag(np.linalg.pinv(information)), 0, None))
+    return ELO_SCALE * (strength - strength.mean()), ELO_SCALE * errors
+
+
+def report(names, results):
+    """
+    Description:
+        - Prints the win/draw/loss table and the Elo ratings of a tournament
+
+    Parameters:
+        - names (list) : The agents
+        - results (list) : The game dicts
+
+    Returns:
+        - None
+    """
+    index = {name: i for i, name in enumerate(names)}
+    n = len(names)
+    wins, draws, games = np.zeros((n, n), int), np.zeros((n, n), int), np.zeros((n, n), int)
+    for result in results:
+        x, o = index[result['x']], index[result['o']]
+        games[x, o] += 1; games[o, x] += 1
+        if result['winner'] == 'X': wins[x, o] += 1
+        elif result['winner'] == 'O': wins[o, x] += 1
+        else: draws[x, o] += 1; draws[o, x] += 1
+
+    width = max(len(name) for name in names) + 2
+    print("Win/draw/loss of each row against each column")
+    print(' ' * width + ''.join(f"{name:>{width + 6}}" for name in names))
+    for i, name in enumerate(names):
+        cells = ['-' if i == j else f"{wins[i, j]}/{draws[i, j]}/{wins[j, i]}" for j in range(n)]
+        print(f"{name:<{width}}" + ''.join(f"{cell:>{width + 6}}" for cell in cells))
+
+    ratings, errors = elo_ratings(names, wins + 0.5 * draws, games)
+    print("\nElo ratings (95% confidence interval)")
+    for i in np.argsort(-ratings):
+        print(f"{names[i]:<{width}}{ratings[i]:8.1f}  ±{1.96 * errors[i]:.1f}   ({wins[i].sum()}W {draws[i].sum()}D {wins[:, i].sum()}L)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play a round-robin tournament between Tic Tac Toe agents')
+    parser.add_argument('-agents', nargs='+', default=['simpleAI', 'randomAI', 'monteCarloAI', 'mctsAI', 'minimaxAI', 'alphaBetaAI'], help='Agents taking part')
+    parser.add_argument('-games', default=100, type=int, help='Games per pair of agents, alternating who plays X')
+    parser.add_argument('-w', default=3, type=int, help='Rows of game')
+    parser.add_argument('-l', default=3, type=int, help='Columns of game')
+    parser.add_argument('-k', default=None, type=int, help='Number in a row needed to win. Defaults to min(3, rows, columns).')
+    parser.add_argument('-seed', default=0, type=int, help='Tournament seed. Each game gets its own seed derived from it.')
+    parser.add_argument('-processes', default=os.cpu_count(), type=int, help='Worker processes playing games in parallel')
+    parser.add_argument('-chunk', default=50, type=int, help='Games sent to a worker at a time')
+    parser.add_argument('-o', default='tournament.jsonl', type=str, help='File the game results are streamed to, one JSON object per line')
+    parser.add_argument('-record', default=None, type=str, help='File to also append the games to in the compact record format of records.py')
+    add_agent_arguments(parser)
+    args = parser.parse_args()
+    if args.k is None: args.k = min(3, args.w, args.l)
+    for name in args.agents:
+        if name not in agents or name == 'human': parser.error(f"unknown AI agent {name}")
+        try: check_agent(name, args, args.w, args.l, args.k)
+        except ValueError as error: parser.error(str(error))
+    if args.book is not None: parser.error("-book is not supported in tournaments")
+    if args.record is not None:
+        try: check_shape(args.w, args.l)
+        except ValueError as error: parser.error(str(error))
+    args.workers = 1  # Games are already spread over the processes
+    args.ponder = False  # Pondering makes results depend on thread timing
+
+    tasks = schedule(args.agents, args.games, args.seed)
+    chunks = [tasks[i:i + args.chunk] for i in range(0, len(tasks), args.chunk)]
+    results = []
+    start = time.perf_counter()
+    record = None if args.record is None else RecordWriter(args.record)
+    with open(args.o, 'w') as out, ProcessPoolExecutor(max_workers=args.processes) as pool:
+        for chunk in pool.map(play_games, chunks, [args] * len(chunks)):
+            for result in chunk:
+                out.write(json.dumps(result) + '\n')
+                if record is not None:
+                    record.write(args.w, args.l, args.k, agents[result['x']], agents[result['o']], result['seed'],
+                                 'Tie' if result['winner'] == 'tie' else result['winner'], [row * args.l + col for row, col in result['moves']])
+            out.flush()
+            results.extend(chunk)
+            print(f"\r{len(results)}/{len(tasks)} games, {len(results) / (time.perf_counter() - start):.0f} games/s", end='', flush=True)
+    print('\n')
+    report(args.agents, results)
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+
+# Bound types of a stored value
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class TranspositionTable:
+    def __init__(self, max_entries=1000000):
+        """
+        Description:
+            - Cache of searched positions shared by the search agents. Positions are keyed
+              by their canonical symmetric image, so the 8 symmetric copies of a 3x3
+              position share one entry. Values are stored from the point of view of the
+              player to move. The least recently used entry is evicted once the table
+              holds max_entries positions.
+
+        Parameters:
+            - max_entries (int) : Maximum number of positions kept in the table
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, state):
+        """
+        Description:
+            - Looks up a position
+
+        Parameters:
+            - state (Bitboard) : The position to look up
+
+        Returns:
+            - (value, flag, move, depth) if the position is stored, None otherwise. value is
+              from the point of view of the player to move, flag is EXACT, LOWER or UPPER,
+              move is the best cell in the coordinates of state (or None) and depth is the
+              number of plies the value was searched to.
+        """
+        x, o, _, inverse = state.canonical()
+        key = (state.rows, state.cols, state.k, state.turn, x, o)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        value, flag, move, depth = entry
+        if move is not None: move = inverse[move]
+        return value, flag, move, depth
+
+    def store(self, state, value, flag, move, depth):
+        """
+        Description:
+            - Stores the result of a search, evicting the least recently used position if
+              the table is full
+
+        Parameters:
+            - state (Bitboard) : The searched position
+            - value : The value from the point of view of the player to move
+            - flag (int) : EXACT, LOWER or UPPER
+            - move (int) : The best cell in the coordinates of state, or None
+            - depth (int) : The number of plies the value was searched to
+
+        Returns:
+            - None
+        """
+        x, o, perm, _ = state.canonical()
+        key = (state.rows, state.cols, state.k, state.turn, x, o)
+        self.entries[key] = (value, flag, None if move is None else perm[move], depth)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Description:
+            - Removes every entry and resets the hit and miss counters
+
+        Parameters:
+            - None
+
+        Returns:
+            - None
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        Description:
+            - Reports the table's usage counters
+
+        Parameters:
+            - None
+
+        Returns:
+            - A dict with the entries, hits, misses and hit rate of the table
+        """
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# Table shared by every MinimaxAI and AlphaBetaAI that is not given its own
+shared_table = TranspositionTable()